@@ -1,19 +1,48 @@
-from typing import Literal, Optional, List, Dict
+from typing import Literal, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime
+from urllib.parse import unquote
+import os
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.backend.modules.data_loader import load_data
-from src.backend.modules.price_analysis import calculate_average_price
+from src.backend.modules.price_analysis import (
+    calculate_average_price,
+    get_price_distribution,
+)
 from src.backend.modules.listings_analysis import get_listings_by_timeframe
 from src.backend.modules.keyword_analysis import (
     get_top_keywords,
     get_keyword_price_analysis,
 )
-from src.backend.modules.ai_price_analysis import ListingPriceAnalyzer
+from src.backend.modules.summary_analysis import get_brand_summary
+from src.backend.modules.brand_comparison import (
+    all_brands_requested,
+    compare_brands,
+    get_brand_leaderboard,
+    resolve_brands,
+)
+from src.backend.modules.brand_stats import MIN_BRAND_LISTINGS
+from src.backend.modules.data_loader import normalize_brand
+from src.backend.modules.response_cache import ResponseCache
+from src.backend.modules.work_pool import WorkPool
+from src.backend.modules.snapshot import (
+    DatasetManager,
+    DatasetSnapshot,
+    load_snapshot,
+)
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fit the similarity index and watch for new crawler data in the
+    # background so startup isn't blocked
+    datasets.start_watcher(float(os.environ.get("VINTALYTICS_RELOAD_INTERVAL", "30")))
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -24,9 +53,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Serialized responses, 64 MB unless VINTALYTICS_CACHE_MB says otherwise
+response_cache = ResponseCache(
+    int(float(os.environ.get("VINTALYTICS_CACHE_MB", "64")) * 1024 * 1024)
+)
+
 # Choose your data source
 
-df = load_data()
+# With VINTALYTICS_SHARED_DATASET=1 a snapshot on disk is mapped so all
+# uvicorn workers share one copy
+shared_dataset = os.environ.get("VINTALYTICS_SHARED_DATASET") == "1"
+# The loaded dataset and its indexes, replaced as a whole on reload.
+# Endpoints read datasets.current once and use only that snapshot
+datasets = DatasetManager(
+    load_snapshot(shared_dataset),
+    shared=shared_dataset,
+    on_swap=lambda snapshot: response_cache.clear(),
+)
+
+
+# Limits for the blocking work behind each kind of endpoint, so one slow
+# kind can't take all threads. Timeouts are in seconds
+request_timeout = float(os.environ.get("VINTALYTICS_REQUEST_TIMEOUT", "30"))
+pools = {
+    "time_series": WorkPool("time series", 8, 64, request_timeout),
+    "keywords": WorkPool("keyword", 4, 32, request_timeout),
+    "similar": WorkPool("similar listings", 2, 16, request_timeout),
+}
+
+
+async def cached(
+    request: Request,
+    snapshot: DatasetSnapshot,
+    key: tuple,
+    compute,
+    pool: Optional[WorkPool] = None,
+) -> Response:
+    # The version in the key keeps responses of an older dataset from being served
+    run = pool.run if pool is not None else None
+    return await response_cache.respond(request, (snapshot.version, *key), compute, run)
+
+
+def brand_key(brand_name: str) -> str:
+    # Spellings that look up the same brand, e.g. "Zara" and " zara", share a cache entry
+    return normalize_brand(unquote(brand_name))
+
+
+def brand_display_name(snapshot: DatasetSnapshot, brand_name: str) -> str:
+    # Responses name the brand as the dataset spells it, whatever the request did
+    return snapshot.brand_stats.display_name(brand_key(brand_name)) or brand_name
 
 
 @app.get("/")
@@ -35,28 +110,30 @@ async def root():
 
 
 @app.get("/api/brands")
-async def get_brands() -> Dict[str, List[Dict[str, int | str]]]:
-    # Get brand counts
-    brand_counts = df["Brand"].value_counts()
-    # Filter brands with at least certain number of entries
-    qualified_brands = brand_counts[brand_counts >= 100]
-    # Convert to list of dictionaries with brand and count
-    brands_list = [
-        {"brand": brand, "count": int(count)}
-        for brand, count in qualified_brands.items()
-    ]
-    # Sort by count descending
-    brands_list.sort(key=lambda x: x["count"], reverse=True)
-    return {"brands": brands_list}
+async def get_brands(
+    request: Request,
+    min_count: int = MIN_BRAND_LISTINGS,
+    prefix: Optional[str] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+):
+    snapshot = datasets.current
+    if offset < 0 or (limit is not None and limit < 1):
+        raise HTTPException(
+            status_code=400, detail="offset must be at least 0 and limit at least 1"
+        )
 
+    def compute():
+        # Brands by count, optionally those starting with prefix
+        ranks = snapshot.brand_stats.query(min_count, prefix)
+        page = ranks[offset:] if limit is None else ranks[offset:offset + limit]
+        return {"brands": snapshot.brand_stats.entries(page), "total": len(ranks)}
 
-@app.get("/api/{brand_name}/{time_unit}/pricing/average")
-async def get_average_price_timeframe(
-    brand_name: str,
-    time_unit: Literal["weekly", "monthly", "yearly"],
-    start: Optional[str] = None,
-    end: Optional[str] = None,
-):
+    key = ("brands", min_count, prefix or None, offset, limit)
+    return await cached(request, snapshot, key, compute)
+
+
+def validate_dates(start: Optional[str], end: Optional[str]):
     try:
         # Validate dates if provided
         if start:
@@ -68,76 +145,275 @@ async def get_average_price_timeframe(
             status_code=400, detail="Invalid date format. Use YYYY-MM-DD"
         )
 
-    data = calculate_average_price(df, brand_name, time_unit, start, end)
 
-    if not data:
-        raise HTTPException(status_code=404, detail="No data found for brand")
+@app.get("/api/{brand_name}/{time_unit}/pricing/average")
+async def get_average_price_timeframe(
+    request: Request,
+    brand_name: str,
+    time_unit: Literal["weekly", "monthly", "yearly"],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
+    snapshot = datasets.current
+    validate_dates(start, end)
+
+    def compute():
+        data = calculate_average_price(
+            snapshot.rollup, brand_name, time_unit, start, end
+        )
+
+        if not data:
+            raise HTTPException(status_code=404, detail="No data found for brand")
+
+        return {
+            "brand": brand_display_name(snapshot, brand_name),
+            "time_unit": time_unit,
+            "data": data,
+        }
+
+    key = ("pricing", brand_key(brand_name), time_unit, start or None, end or None)
+    return await cached(request, snapshot, key, compute, pools["time_series"])
+
+
+@app.get("/api/{brand_name}/pricing/distribution")
+async def get_price_distribution_timeframe(
+    request: Request,
+    brand_name: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    buckets: int = 10,
+):
+    snapshot = datasets.current
+    validate_dates(start, end)
+    if not 1 <= buckets <= 100:
+        raise HTTPException(status_code=400, detail="buckets must be between 1 and 100")
+
+    def compute():
+        distribution = get_price_distribution(
+            snapshot.rollup, brand_name, start, end, buckets
+        )
+
+        if distribution is None:
+            raise HTTPException(status_code=404, detail="No data found for brand")
 
-    return {"brand": brand_name, "time_unit": time_unit, "data": data}
+        return {"brand": brand_display_name(snapshot, brand_name), **distribution}
+
+    key = ("distribution", brand_key(brand_name), start or None, end or None, buckets)
+    return await cached(request, snapshot, key, compute, pools["time_series"])
 
 
 @app.get("/api/{brand_name}/{time_unit}/listings/count")
 async def get_listings_timeframe(
+    request: Request,
     brand_name: str,
     time_unit: Literal["weekly", "monthly", "yearly"],
     start: Optional[str] = None,
     end: Optional[str] = None,
 ):
-    try:
-        # Validate dates if provided
-        if start:
-            datetime.strptime(start, "%Y-%m-%d")
-        if end:
-            datetime.strptime(end, "%Y-%m-%d")
-    except ValueError:
-        raise HTTPException(
-            status_code=400, detail="Invalid date format. Use YYYY-MM-DD"
+    snapshot = datasets.current
+    validate_dates(start, end)
+
+    def compute():
+        data = get_listings_by_timeframe(
+            snapshot.rollup, brand_name, time_unit, start, end
         )
 
-    data = get_listings_by_timeframe(df, brand_name, time_unit, start, end)
+        if not data:
+            raise HTTPException(status_code=404, detail="No data found for brand")
 
-    if not data:
-        raise HTTPException(status_code=404, detail="No data found for brand")
+        return {
+            "brand": brand_display_name(snapshot, brand_name),
+            "time_unit": time_unit,
+            "data": data,
+        }
 
-    return {"brand": brand_name, "time_unit": time_unit, "data": data}
+    key = ("listings", brand_key(brand_name), time_unit, start or None, end or None)
+    return await cached(request, snapshot, key, compute, pools["time_series"])
 
 
 @app.get("/api/{brand_name}/keywords/top/{limit}")
-async def get_brand_keywords(brand_name: str, limit: int):
-    keywords = get_top_keywords(df, brand_name, limit)
+async def get_brand_keywords(request: Request, brand_name: str, limit: int):
+    snapshot = datasets.current
 
-    if not keywords:
-        raise HTTPException(status_code=404, detail="Brand not found")
+    def compute():
+        keywords = get_top_keywords(snapshot.keyword_index, brand_name, limit)
 
-    return {"brand": brand_name, "keywords": keywords}
+        if not keywords:
+            raise HTTPException(status_code=404, detail="Brand not found")
 
+        return {"brand": brand_display_name(snapshot, brand_name), "keywords": keywords}
 
-@app.get("/api/{brand_name}/keywords/{keywords}")
-async def get_keyword_analysis(brand_name: str, keywords: str):
-    # Split keywords by comma and clean
-    keyword_list = [k.strip() for k in keywords.split(",")]
+    key = ("keywords/top", brand_key(brand_name), limit)
+    return await cached(request, snapshot, key, compute, pools["keywords"])
 
-    analysis = get_keyword_price_analysis(df, brand_name, keyword_list)
 
-    if analysis is None:
-        raise HTTPException(
-            status_code=404, detail="No items found matching all keywords"
+@app.get("/api/{brand_name}/keywords/{keywords}")
+async def get_keyword_analysis(request: Request, brand_name: str, keywords: str):
+    snapshot = datasets.current
+    # Split keywords by comma and clean, they are matched in lower case
+    keyword_list = [k.strip().lower() for k in keywords.split(",")]
+
+    def compute():
+        analysis = get_keyword_price_analysis(
+            snapshot.df, snapshot.token_index, brand_name, keyword_list
         )
 
-    return {"brand": brand_name, "keywords": keyword_list, "analysis": analysis}
+        if analysis is None:
+            raise HTTPException(
+                status_code=404, detail="No items found matching all keywords"
+            )
+
+        return {
+            "brand": brand_display_name(snapshot, brand_name),
+            "keywords": keyword_list,
+            "analysis": analysis,
+        }
+
+    key = ("keywords", brand_key(brand_name), tuple(keyword_list))
+    return await cached(request, snapshot, key, compute, pools["keywords"])
 
 # Add to FastAPI endpoints
 @app.get("/api/ai/similar-listings/{keywords}")
-async def get_similar_listings(keywords: str):
-    keywords_list = keywords.split(',')
-    analyzer = ListingPriceAnalyzer()
-    analyzer.load_and_prepare_data(df)  # df from main.py
-    
-    results = analyzer.find_similar_listings(keywords_list)
-    if not results:
-        raise HTTPException(status_code=404, detail="No similar listings found")
-        
-    return {
-        "keywords": keywords_list,
-        "analysis": results
-    }
\ No newline at end of file
+async def get_similar_listings(request: Request, keywords: str):
+    snapshot = datasets.current
+    # The similarity index lower-cases the keywords anyway
+    keywords_list = [k.lower() for k in keywords.split(',')]
+    analyzer = snapshot.analyzer
+    if analyzer is None:
+        raise HTTPException(
+            status_code=503, detail="Similarity index is still loading, try again shortly"
+        )
+
+    def compute():
+        results = analyzer.find_similar_listings(keywords_list)
+        if not results:
+            raise HTTPException(status_code=404, detail="No similar listings found")
+
+        return {
+            "keywords": keywords_list,
+            "analysis": results
+        }
+
+    key = ("similar", tuple(keywords_list))
+    return await cached(request, snapshot, key, compute, pools["similar"])
+
+
+@app.get("/api/{brand_name}/{time_unit}/summary")
+async def get_summary_timeframe(
+    request: Request,
+    brand_name: str,
+    time_unit: Literal["weekly", "monthly", "yearly"],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    keyword_limit: int = 15,
+):
+    snapshot = datasets.current
+    validate_dates(start, end)
+
+    def compute():
+        summary = get_brand_summary(
+            snapshot.df,
+            snapshot.rollup,
+            snapshot.keyword_index,
+            brand_name,
+            time_unit,
+            start,
+            end,
+            keyword_limit,
+        )
+
+        if summary is None:
+            raise HTTPException(status_code=404, detail="No data found for brand")
+
+        return {"brand": brand_display_name(snapshot, brand_name), "time_unit": time_unit, **summary}
+
+    key = ("summary", brand_key(brand_name), time_unit, start or None, end or None, keyword_limit)
+    return await cached(request, snapshot, key, compute, pools["time_series"])
+
+
+# Upper limit for an explicit brand list, and for the most listed brands a
+# comparison of all brands returns
+MAX_COMPARED_BRANDS = 200
+
+
+def resolve_compared_brands(
+    snapshot: DatasetSnapshot, brands: Optional[str], top: Optional[int] = None
+) -> list[str]:
+    if all_brands_requested(brands):
+        return resolve_brands(snapshot.brand_stats, brands, top)
+
+    brand_list = resolve_brands(snapshot.brand_stats, brands)
+    if len(brand_list) > MAX_COMPARED_BRANDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_COMPARED_BRANDS} brands can be compared at once",
+        )
+    return brand_list
+
+
+def compared_brands_key(brand_list: list[str]) -> tuple:
+    # Resolved lists are canonical, so spellings and orders of the same
+    # brands share a cache entry
+    return tuple(normalize_brand(brand) for brand in brand_list)
+
+
+@app.get("/api/compare/{time_unit}")
+async def get_brand_comparison(
+    request: Request,
+    time_unit: Literal["weekly", "monthly", "yearly"],
+    brands: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
+    snapshot = datasets.current
+    validate_dates(start, end)
+    # All brands are capped to the most listed, one series each
+    brand_list = resolve_compared_brands(snapshot, brands, MAX_COMPARED_BRANDS)
+
+    def compute():
+        comparison = compare_brands(snapshot.rollup, brand_list, time_unit, start, end)
+
+        if comparison is None:
+            raise HTTPException(status_code=404, detail="No data found for these brands")
+
+        return {"time_unit": time_unit, **comparison}
+
+    key = ("compare", compared_brands_key(brand_list), time_unit, start or None, end or None)
+    return await cached(request, snapshot, key, compute, pools["time_series"])
+
+
+@app.get("/api/leaderboard/{time_unit}")
+async def get_leaderboard(
+    request: Request,
+    time_unit: Literal["weekly", "monthly", "yearly"],
+    brands: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 10,
+):
+    snapshot = datasets.current
+    validate_dates(start, end)
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    # Rankings are computed over every qualified brand at once
+    brand_list = resolve_compared_brands(snapshot, brands)
+
+    def compute():
+        leaderboard = get_brand_leaderboard(
+            snapshot.rollup, brand_list, time_unit, start, end, limit
+        )
+
+        if leaderboard is None:
+            raise HTTPException(status_code=404, detail="No data found for these brands")
+
+        return {"time_unit": time_unit, **leaderboard}
+
+    key = (
+        "leaderboard",
+        compared_brands_key(brand_list),
+        time_unit,
+        start or None,
+        end or None,
+        limit,
+    )
+    return await cached(request, snapshot, key, compute, pools["time_series"])
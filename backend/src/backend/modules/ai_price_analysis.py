@@ -1,41 +1,194 @@
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+import json
+import os
+import shutil
+from typing import List, Dict, Optional
+
+from src.backend.modules.array_store import (
+    file_lock,
+    load_array,
+    load_sparse,
+    save_arrays,
+    save_sparse,
+)
+
+# Bump whenever the vectorizer settings or the prepared data change,
+# so stale indexes on disk get rebuilt
+INDEX_VERSION = 3
+
+# scikit-learn only ships an English stop word list
+GERMAN_STOP_WORDS = [
+    'aber', 'alle', 'als', 'am', 'an', 'auch', 'auf', 'aus', 'bei', 'bin',
+    'bis', 'das', 'dass', 'dem', 'den', 'der', 'des', 'die', 'du', 'ein',
+    'eine', 'einem', 'einen', 'einer', 'er', 'es', 'für', 'gr', 'größe',
+    'hat', 'ich', 'ihr', 'im', 'in', 'ist', 'ja', 'kein', 'mit', 'nach',
+    'neu', 'nicht', 'noch', 'nur', 'oder', 'sehr', 'sie', 'sind', 'so',
+    'und', 'von', 'vom', 'war', 'wie', 'wir', 'zu', 'zum', 'zur',
+]
+
+
+def index_path(directory: str, fingerprint: str) -> str:
+    """Directory of the index saved for a dataset fingerprint."""
+    return os.path.join(directory, f"v{INDEX_VERSION}-{fingerprint}")
+
+
+def prune_indexes(directory: str, keep: str):
+    """
+    Remove the indexes of other dataset fingerprints and leftovers of
+    interrupted saves. Snapshots that still map them keep working, the
+    files are only freed once they are unmapped.
+    """
+    keep_path = index_path(directory, keep)
+    with file_lock(os.path.join(directory, '.lock')):
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if path != keep_path and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
 
 class ListingPriceAnalyzer:
-    def __init__(self):
+    def __init__(self, vocabulary: Optional[Dict[str, int]] = None):
         self.vectorizer = TfidfVectorizer(
-            stop_words='german',
+            stop_words=GERMAN_STOP_WORDS,
             min_df=1,
             ngram_range=(1, 3),
-            max_features=5000
+            max_features=5000,
+            vocabulary=vocabulary
         )
         self.embeddings = None
         self.df = None
+        self.rows = None
+        self.ids = None
         
     def load_and_prepare_data(self, df: pd.DataFrame):
         """Load data and create TF-IDF vectors for all listings"""
-        self.df = df.copy()
-        
-        # Clean price data
-        self.df['Price'] = pd.to_numeric(self.df['Price'], errors='coerce')
-        self.df = self.df.dropna(subset=['Price'])  # Remove rows with invalid prices
+        # Remove rows with invalid prices (already numeric from load_data).
+        # The frame is referenced rather than copied, embedding i belongs
+        # to row rows[i]
+        self.df = df
+        self.rows = np.flatnonzero(df['Price'].notna().to_numpy())
+        listings = df.iloc[self.rows]
+        self.ids = listings['ID'].to_numpy()
         
         # Combine relevant fields for text analysis
-        self.df['combined_text'] = (
-            self.df['Title'].fillna('') + ' ' + 
-            self.df['Categories'].fillna('') + ' ' + 
-            self.df['Colors'].fillna('') + ' ' + 
-            self.df['Materials'].fillna('') + ' ' + 
-            self.df['Styles'].fillna('')
+        combined_text = (
+            listings['Title'].fillna('') + ' ' + 
+            listings['Categories'].fillna('') + ' ' + 
+            listings['Colors'].fillna('') + ' ' + 
+            listings['Materials'].fillna('') + ' ' + 
+            listings['Styles'].fillna('')
         ).str.lower()
         
         # Create TF-IDF matrix
         print("Creating text vectors for listings...")
-        self.embeddings = self.vectorizer.fit_transform(self.df['combined_text'])
+        # Stored by column, so each term's column is the posting list of the
+        # listings containing it
+        self.embeddings = self.vectorizer.fit_transform(combined_text).tocsc()
+        self.embeddings.sort_indices()
+
+    def save(self, path: str, fingerprint: str):
+        """Persist the fitted vectorizer and TF-IDF matrix to a directory"""
+        save_sparse(path, 'embeddings', self.embeddings)
+        save_arrays(
+            path,
+            terms=self.vectorizer.get_feature_names_out().astype(str),
+            idf=self.vectorizer.idf_,
+            rows=self.rows,
+            ids=self.ids
+        )
+        # Written last so a partially saved index is never picked up
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'fingerprint': fingerprint}, f)
+
+    @classmethod
+    def load(cls, path: str, df: pd.DataFrame, fingerprint: str) -> Optional["ListingPriceAnalyzer"]:
+        """
+        Load a saved index, or return None if it is missing or stale.
+        The TF-IDF matrix is memory-mapped, so workers share its pages.
+        """
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta != {'version': INDEX_VERSION, 'fingerprint': fingerprint}:
+                return None
+
+            terms = load_array(path, 'terms')
+            idf = np.array(load_array(path, 'idf'))
+            rows = np.array(load_array(path, 'rows'))
+            ids = load_array(path, 'ids')
+            embeddings = load_sparse(path, 'embeddings', format='csc')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not load similarity index from {path}: {str(e)}")
+            return None
+
+        # Rows must line up with the listings the index was built from
+        if len(rows) and rows[-1] >= len(df):
+            return None
+        if not np.array_equal(df['ID'].to_numpy()[rows], ids):
+            return None
+
+        analyzer = cls(vocabulary={term: i for i, term in enumerate(terms)})
+        analyzer.vectorizer.idf_ = idf
+        analyzer.embeddings = embeddings
+        analyzer.df = df
+        analyzer.rows = rows
+        analyzer.ids = ids
+        return analyzer
+
+    @classmethod
+    def load_or_build(cls, df: pd.DataFrame, directory: str, fingerprint: str) -> "ListingPriceAnalyzer":
+        """
+        Reuse the index saved for this dataset fingerprint, refitting only if
+        needed. The lock lets one worker fit while the others wait and load.
+        Each fingerprint gets its own directory and a refit is written to a
+        temporary one first, so files another snapshot has mapped are never
+        overwritten.
+        """
+        path = index_path(directory, fingerprint)
+        with file_lock(os.path.join(directory, '.lock')):
+            analyzer = cls.load(path, df, fingerprint)
+            if analyzer is not None:
+                print(f"Loaded similarity index from {path}")
+                return analyzer
+
+            analyzer = cls()
+            analyzer.load_and_prepare_data(df)
+            tmp_path = os.path.join(directory, f".tmp-{os.getpid()}")
+            try:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                analyzer.save(tmp_path, fingerprint)
+                # A stale index of this name can't be in use, it failed to load.
+                # Removing mapped files only unlinks them
+                shutil.rmtree(path, ignore_errors=True)
+                os.replace(tmp_path, path)
+            except (OSError, ValueError) as e:
+                print(f"Could not save similarity index to {path}: {str(e)}")
+        return analyzer
         
+    def score(self, keyword_vector) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Cosine similarity of a TF-IDF query against the listings containing
+        at least one of its terms, by walking the terms' posting lists. Rows
+        are L2-normalized, so the dot product is the cosine. Returns the
+        candidate embedding rows and their scores; all other listings score 0.
+        """
+        indptr = self.embeddings.indptr
+        rows, weights = [], []
+        for term, weight in zip(keyword_vector.indices, keyword_vector.data):
+            start, stop = indptr[term], indptr[term + 1]
+            rows.append(self.embeddings.indices[start:stop])
+            weights.append(self.embeddings.data[start:stop] * weight)
+        if not rows:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+        candidates, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights), minlength=len(candidates))
+        return candidates, scores
+
     def find_similar_listings(self, keywords: List[str], threshold: float = 0.1) -> Dict:
         """Find similar listings based on keywords using TF-IDF and cosine similarity"""
         try:
@@ -45,24 +198,25 @@ class ListingPriceAnalyzer:
             # Transform keywords using the same vectorizer
             keyword_vector = self.vectorizer.transform([keyword_text])
             
-            # Calculate similarities using cosine similarity
-            similarities = cosine_similarity(keyword_vector, self.embeddings)[0]
+            # Score only the listings sharing a term with the keywords
+            candidates, similarities = self.score(keyword_vector)
             
             # Dynamic threshold based on result count
-            initial_matches = np.where(similarities >= threshold)[0]
-            if len(initial_matches) < 20:  # If we have too few matches
+            selected = np.flatnonzero(similarities >= threshold)
+            if len(selected) < 20:  # If we have too few matches
                 # Find top 20 matches regardless of threshold
-                matching_indices = np.argsort(similarities)[-20:]
-            else:
-                matching_indices = initial_matches
+                top = min(20, len(candidates))
+                selected = np.argpartition(-similarities, top - 1)[:top] if top else selected
+            matching_indices = candidates[selected]
             
-            matching_listings = self.df.iloc[matching_indices]
+            columns = self.df.columns.get_indexer(['Title', 'Price', 'Brand'])
+            matching_listings = self.df.iloc[self.rows[matching_indices], columns]
             
             if matching_listings.empty:
                 return None
             
             # Sort by similarity score
-            similarity_scores = similarities[matching_indices]
+            similarity_scores = similarities[selected]
             matching_listings = matching_listings.assign(similarity=similarity_scores)
             matching_listings = matching_listings.sort_values('similarity', ascending=False)
             
@@ -109,4 +263,5 @@ class ListingPriceAnalyzer:
             
         except Exception as e:
             print(f"Error in find_similar_listings: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
@@ -0,0 +1,136 @@
+import contextlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from scipy import sparse
+
+try:
+    import fcntl
+except ImportError:  # Windows, locking is skipped
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """
+    Hold an exclusive lock on a file for the duration of the block, so
+    only one worker process builds a shared artifact at a time.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def save_arrays(path: str, **arrays: np.ndarray):
+    """Save each array as its own .npy file so it can be memory-mapped."""
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.asarray(array), allow_pickle=False)
+
+
+def load_array(path: str, name: str) -> np.ndarray:
+    """Memory-map a saved array read-only; pages are shared between processes."""
+    return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+
+
+def save_sparse(path: str, name: str, matrix: sparse.spmatrix):
+    """Save the CSR/CSC component arrays of a sparse matrix."""
+    save_arrays(
+        path,
+        **{
+            f"{name}_data": matrix.data,
+            f"{name}_indices": matrix.indices,
+            f"{name}_indptr": matrix.indptr,
+            f"{name}_shape": np.array(matrix.shape, dtype=np.int64),
+        },
+    )
+
+
+def load_sparse(path: str, name: str, format: str = "csr") -> sparse.spmatrix:
+    """Rebuild a sparse matrix on top of its memory-mapped component arrays."""
+    matrix_type = sparse.csr_matrix if format == "csr" else sparse.csc_matrix
+    matrix = matrix_type(
+        (
+            load_array(path, f"{name}_data"),
+            load_array(path, f"{name}_indices"),
+            load_array(path, f"{name}_indptr"),
+        ),
+        shape=tuple(load_array(path, f"{name}_shape")),
+        copy=False,
+    )
+    # Saved matrices were already in canonical form
+    matrix.has_sorted_indices = True
+    return matrix
+
+
+def save_index(path: str, name: str, index: pd.Index):
+    """Save a small index (e.g. category labels) as JSON."""
+    with open(os.path.join(path, f"{name}.json"), "w") as f:
+        json.dump([None if pd.isna(value) else str(value) for value in index], f)
+
+
+def load_index(path: str, name: str) -> pd.Index:
+    with open(os.path.join(path, f"{name}.json")) as f:
+        return pd.Index(json.load(f), dtype=object)
+
+
+def save_frame(path: str, df: pd.DataFrame):
+    """
+    Save a DataFrame in memory-mappable form: numeric and datetime columns
+    as .npy files, categoricals as codes plus labels, and text columns
+    in one uncompressed Arrow IPC file.
+    """
+    os.makedirs(path, exist_ok=True)
+    layout = {}
+    text_columns = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            save_arrays(path, **{f"{column}_codes": series.cat.codes.to_numpy()})
+            save_index(path, f"{column}_categories", series.cat.categories)
+            layout[column] = "category"
+        elif series.dtype.kind in "biufM":
+            save_arrays(path, **{column: series.to_numpy()})
+            layout[column] = "array"
+        else:
+            text_columns[column] = pa.array(series.astype("string"), type=pa.string())
+            layout[column] = "text"
+
+    with pa.OSFile(os.path.join(path, "text.arrow"), "wb") as sink:
+        table = pa.table(text_columns) if text_columns else pa.table({})
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    with open(os.path.join(path, "frame.json"), "w") as f:
+        json.dump({"columns": layout, "rows": len(df)}, f)
+
+
+def load_frame(path: str) -> pd.DataFrame:
+    """Map a frame saved by save_frame without copying its columns."""
+    with open(os.path.join(path, "frame.json")) as f:
+        layout = json.load(f)
+
+    text = pa.ipc.open_file(pa.memory_map(os.path.join(path, "text.arrow"))).read_all()
+    columns = {}
+    for column, kind in layout["columns"].items():
+        if kind == "category":
+            columns[column] = pd.Categorical.from_codes(
+                load_array(path, f"{column}_codes"),
+                categories=load_index(path, f"{column}_categories"),
+            )
+        elif kind == "array":
+            columns[column] = load_array(path, column)
+        else:
+            columns[column] = pd.arrays.ArrowExtensionArray(text.column(column))
+
+    # copy=False keeps every column backed by its mapped file
+    return pd.DataFrame(columns, copy=False)
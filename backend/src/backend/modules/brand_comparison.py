@@ -0,0 +1,175 @@
+from typing import Optional
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+from src.backend.modules.brand_stats import BrandStats
+from src.backend.modules.data_loader import normalize_brand
+from src.backend.modules.time_rollup import TimeRollup, TimeUnit
+
+
+def all_brands_requested(brands: Optional[str]) -> bool:
+    """None, "" and "all" stand for all qualified brands."""
+    return not brands or brands.strip().lower() == "all"
+
+
+def _unique_brands(names) -> dict[str, str]:
+    """Map normalized names to the first spelling of each."""
+    unique = {}
+    for name in names:
+        if name:
+            unique.setdefault(normalize_brand(name), name)
+    return unique
+
+
+def resolve_brands(
+    brand_stats: BrandStats, brands: Optional[str], top: Optional[int] = None
+) -> list[str]:
+    """
+    Parse a comma separated brand list. If all brands are requested, the
+    qualified brands are returned, most listed first and at most top of
+    them. Spellings of the same brand are only kept once.
+    A given list comes back in a canonical form: brands with listings as
+    the dataset spells them, most listed first, then the unknown ones
+    normalized and sorted. Any spelling or order of the same brands gives
+    the same list.
+    """
+    if all_brands_requested(brands):
+        names = brand_stats.names[brand_stats.query()[:top]]
+        return list(_unique_brands(names).values())
+
+    unique = _unique_brands(unquote(brand).strip() for brand in brands.split(","))
+    positions = set()
+    unknown = []
+    for key in unique:
+        position = brand_stats.position(key)
+        if position is None:
+            unknown.append(key)
+        else:
+            positions.add(position)
+    return [brand_stats.names[p] for p in sorted(positions)] + sorted(unknown)
+
+
+def _bucket_matrix(rollup, brands, time_unit, start_date, end_date):
+    """
+    Aggregate the brands in one pass and lay the buckets out on a shared
+    date axis: one row per brand, one column per bucket.
+    """
+    buckets = rollup.aggregate_brands(brands, time_unit, start_date, end_date)
+    if buckets.empty:
+        return None
+
+    dates, columns = np.unique(buckets["date"].to_numpy(), return_inverse=True)
+    rows = buckets["brand"].to_numpy()
+    shape = (len(brands), len(dates))
+    counts = np.zeros(shape, dtype=np.int64)
+    price_counts = np.zeros(shape, dtype=np.int64)
+    price_sums = np.zeros(shape, dtype=np.int64)
+    counts[rows, columns] = buckets["count"].to_numpy()
+    price_counts[rows, columns] = buckets["price_count"].to_numpy()
+    price_sums[rows, columns] = buckets["price_sum"].to_numpy()
+
+    # Average in euros, NaN where a bucket has no priced listing
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prices = price_sums / price_counts / 100
+    return dates, counts, prices
+
+
+def compare_brands(
+    rollup: TimeRollup,
+    brands: list[str],
+    time_unit: TimeUnit,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Listing counts and average prices of several brands per time bucket,
+    aligned on one list of dates. Brands without listings in the range are
+    returned under "missing".
+    Returns None if none of the brands has listings in the range.
+    """
+    matrix = _bucket_matrix(rollup, brands, time_unit, start_date, end_date)
+    if matrix is None:
+        return None
+    dates, counts, prices = matrix
+
+    found = counts.sum(axis=1) > 0
+    return {
+        "dates": [date.strftime("%Y-%m-%d") for date in pd.to_datetime(dates)],
+        "series": [
+            {
+                "brand": brand,
+                "counts": counts[i].tolist(),
+                "prices": [
+                    None if np.isnan(price) else round(float(price), 2)
+                    for price in prices[i]
+                ],
+            }
+            for i, brand in enumerate(brands)
+            if found[i]
+        ],
+        "missing": [brand for i, brand in enumerate(brands) if not found[i]],
+    }
+
+
+def get_brand_leaderboard(
+    rollup: TimeRollup,
+    brands: list[str],
+    time_unit: TimeUnit,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = 10,
+) -> Optional[dict]:
+    """
+    Rank brands by listings in the range, by growth of their listing count
+    and by the change of their average price, both from the first to the
+    last bucket of the range.
+    Returns None if none of the brands has listings in the range.
+    """
+    matrix = _bucket_matrix(rollup, brands, time_unit, start_date, end_date)
+    if matrix is None:
+        return None
+    _, counts, prices = matrix
+
+    totals = counts.sum(axis=1)
+    first_counts, last_counts = counts[:, 0], counts[:, -1]
+    first_prices, last_prices = prices[:, 0], prices[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (last_counts - first_counts) / first_counts * 100
+        price_change = (last_prices - first_prices) / first_prices * 100
+
+    most_listings = np.flatnonzero(totals)
+    most_listings = most_listings[np.argsort(-totals[most_listings], kind="stable")]
+
+    # Only brands listed in the first bucket have a growth rate
+    growing = np.flatnonzero(first_counts > 0)
+    growing = growing[np.argsort(-growth[growing], kind="stable")]
+
+    changed = np.flatnonzero(~np.isnan(price_change) & (first_prices > 0))
+    changed = changed[np.argsort(-np.abs(price_change[changed]), kind="stable")]
+
+    return {
+        "most_listings": [
+            {"brand": brands[i], "count": int(totals[i])}
+            for i in most_listings[:limit]
+        ],
+        "fastest_growing": [
+            {
+                "brand": brands[i],
+                "first_count": int(first_counts[i]),
+                "last_count": int(last_counts[i]),
+                "growth_percent": round(float(growth[i]), 2),
+            }
+            for i in growing[:limit]
+        ],
+        "largest_price_change": [
+            {
+                "brand": brands[i],
+                "first_price": round(float(first_prices[i]), 2),
+                "last_price": round(float(last_prices[i]), 2),
+                "change_percent": round(float(price_change[i]), 2),
+            }
+            for i in changed[:limit]
+        ],
+    }
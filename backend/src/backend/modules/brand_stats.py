@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.backend.modules.data_loader import get_prices, normalize_brand
+
+# Brands with fewer listings are left out of /api/brands and "all brands"
+MIN_BRAND_LISTINGS = 100
+
+
+@dataclass
+class BrandStats:
+    """
+    Per-brand listing count, first and last listing day and mean price,
+    materialized once per dataset snapshot. Brands are sorted by count,
+    most listed first, and search_keys holds their normalized names in
+    alphabetical order, so count thresholds and name prefixes are both
+    answered by binary search.
+    """
+
+    names: np.ndarray
+    counts: np.ndarray
+    first_seen: np.ndarray
+    last_seen: np.ndarray
+    mean_prices: np.ndarray
+    search_keys: np.ndarray
+    # Position in names of each entry of search_keys
+    search_ranks: np.ndarray
+
+    def query(
+        self,
+        min_count: int = MIN_BRAND_LISTINGS,
+        prefix: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Return the positions of the brands with at least min_count listings
+        whose normalized name starts with prefix, most listed first.
+        """
+        # Counts are sorted descending, so qualified brands are a prefix
+        cutoff = int(np.searchsorted(-self.counts, -min_count, side="right"))
+        if not prefix:
+            return np.arange(cutoff)
+
+        key = normalize_brand(prefix)
+        start = np.searchsorted(self.search_keys, key, side="left")
+        # Every name starting with key sorts before key + the highest code point
+        stop = np.searchsorted(self.search_keys, key + "\U0010ffff", side="left")
+        ranks = np.sort(self.search_ranks[start:stop])
+        return ranks[: np.searchsorted(ranks, cutoff)]
+
+    def position(self, brand: str) -> Optional[int]:
+        """
+        Return the position in names of the most listed spelling of a
+        brand, or None if the brand has no listings.
+        """
+        key = normalize_brand(brand)
+        position = int(np.searchsorted(self.search_keys, key, side="left"))
+        if position == len(self.search_keys) or self.search_keys[position] != key:
+            return None
+        # Spellings of one key are in count order, most listed first
+        return int(self.search_ranks[position])
+
+    def display_name(self, brand: str) -> Optional[str]:
+        """Return the brand as the dataset spells it, None if it has no listings."""
+        position = self.position(brand)
+        return None if position is None else self.names[position]
+
+    def entries(self, ranks: np.ndarray) -> list[dict]:
+        """Format the brands at the given positions for a response."""
+        return [
+            {
+                "brand": self.names[i],
+                "count": int(self.counts[i]),
+                "first_seen": _format_day(self.first_seen[i]),
+                "last_seen": _format_day(self.last_seen[i]),
+                "mean_price": (
+                    None if np.isnan(self.mean_prices[i]) else round(float(self.mean_prices[i]), 2)
+                ),
+            }
+            for i in ranks
+        ]
+
+
+def _format_day(day: np.datetime64) -> Optional[str]:
+    return None if np.isnat(day) else str(day)
+
+
+def build_brand_stats(df: pd.DataFrame) -> BrandStats:
+    """Aggregate the brand statistics of a loaded frame in one groupby."""
+    if df.empty:
+        empty = np.array([], dtype=object)
+        return BrandStats(
+            names=empty,
+            counts=np.array([], dtype=np.int64),
+            first_seen=np.array([], dtype="datetime64[D]"),
+            last_seen=np.array([], dtype="datetime64[D]"),
+            mean_prices=np.array([], dtype=np.float64),
+            search_keys=np.array([], dtype=str),
+            search_ranks=np.array([], dtype=np.int64),
+        )
+
+    # value_counts is already sorted by count, most listed first
+    counts = df["Brand"].value_counts()
+    counts = counts[counts > 0]
+
+    stats = (
+        pd.DataFrame({"Brand": df["Brand"], "Item_Date": df["Item_Date"], "Price": get_prices(df)})
+        .groupby("Brand", observed=True)
+        .agg(
+            first_seen=("Item_Date", "min"),
+            last_seen=("Item_Date", "max"),
+            mean_price=("Price", "mean"),
+        )
+        .reindex(counts.index)
+    )
+
+    names = counts.index.astype(str).to_numpy(dtype=object)
+    keys = np.array([normalize_brand(name) for name in names], dtype=str)
+    search_ranks = np.argsort(keys, kind="stable")
+    return BrandStats(
+        names=names,
+        counts=counts.to_numpy(dtype=np.int64),
+        first_seen=stats["first_seen"].to_numpy().astype("datetime64[D]"),
+        last_seen=stats["last_seen"].to_numpy().astype("datetime64[D]"),
+        mean_prices=stats["mean_price"].to_numpy(dtype=np.float64),
+        search_keys=keys[search_ranks],
+        search_ranks=search_ranks,
+    )
@@ -1,45 +1,440 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import glob
+import hashlib
+import json
 import os
+from typing import Optional
 
+# Absolute path to the dataset directory. VINTALYTICS_DATASET_DIR points
+# the server at another one, e.g. a generated benchmark dataset
+DATASET_DIR = os.environ.get("VINTALYTICS_DATASET_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))),
+    "dataset",
+)
+# Derived artifacts (search indexes etc.) that can be rebuilt from the CSVs
+CACHE_DIR = os.path.join(DATASET_DIR, "cache")
+# Columnar store written by dataset_store.ingest_dataset
+STORE_DIR = os.path.join(DATASET_DIR, "store")
+# Leading underscore keeps Parquet readers from treating it as data
+STORE_MANIFEST = os.path.join(STORE_DIR, "_manifest.json")
 
-def load_data() -> pd.DataFrame:
+# Columns the analytics actually use, read from the columnar store
+LOAD_COLUMNS = [
+    "ID",
+    "Title",
+    "Brand",
+    "Price",
+    "Currency",
+    "Item_Date",
+    "Colors",
+    "Materials",
+    "Styles",
+    "Categories",
+]
+# Free-text and categorical columns, kept as strings when reading CSVs
+TEXT_COLUMNS = [
+    "Title",
+    "Brand",
+    "Currency",
+    "Colors",
+    "Materials",
+    "Styles",
+    "Categories",
+]
+# Written as lists of labels by the crawler's Parquet output
+LIST_COLUMNS = ["Colors", "Materials", "Styles", "Categories"]
+# The crawler sees the same listing on several days, so a row is one
+# listing on one day
+DEDUP_KEY = ["ID", "Item_Date"]
+# Rows parsed at a time when streaming a crawler file
+CHUNK_ROWS = 100_000
+
+
+def has_store() -> bool:
+    """Whether the dataset has been ingested into the columnar store."""
+    return os.path.exists(STORE_MANIFEST)
+
+
+def get_csv_files() -> list[str]:
+    """Return the sorted list of CSV files in the dataset folder."""
+    return sorted(glob.glob(os.path.join(DATASET_DIR, "*.csv")))
+
+
+def get_source_files() -> list[str]:
+    """
+    Return the sorted crawler output in the dataset folder: CSV files and
+    the Parquet part files of crawls run with --format parquet.
+    """
+    parquet_files = glob.glob(os.path.join(DATASET_DIR, "*.parquet"))
+    return sorted(get_csv_files() + parquet_files)
+
+
+def get_store_files() -> list[str]:
+    """Return the sorted list of Parquet partitions in the columnar store."""
+    return sorted(glob.glob(os.path.join(STORE_DIR, "*", "*.parquet")))
+
+
+def get_dataset_files() -> list[str]:
+    """
+    Return the files load_data reads: the store if present, else the
+    crawler CSV and Parquet files.
+    """
+    if has_store():
+        return get_store_files()
+    return get_source_files()
+
+
+def dataset_fingerprint(files: list[str] | None = None) -> str:
+    """
+    Fingerprint the dataset files by name, size and modification time.
+    Changes whenever a CSV is added, removed or rewritten.
+    """
+    if files is None:
+        files = get_dataset_files()
+
+    digest = hashlib.sha256()
+    for file in sorted(files):
+        stat = os.stat(file)
+        name = os.path.relpath(file, DATASET_DIR)
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def get_file_states(files: list[str] | None = None) -> dict[str, tuple[int, int]]:
+    """Return the size and modification time of each dataset file."""
+    if files is None:
+        files = get_dataset_files()
+
+    states = {}
+    for file in files:
+        stat = os.stat(file)
+        states[file] = (stat.st_size, stat.st_mtime_ns)
+    return states
+
+
+def normalize_brand(brand: str) -> str:
+    """Normalize a brand name for case-insensitive lookups."""
+    return brand.strip().lower()
+
+
+def normalize_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast the raw CSV columns to their analysis types once at load time:
+    datetime dates, float32 prices and categorical brand/currency.
     """
-    Load and process CSV data from the dataset folder.
-    Returns a deduplicated pandas DataFrame containing all CSV data.
+    df["Item_Date"] = pd.to_datetime(df["Item_Date"], errors="coerce")
+    df["Price"] = pd.to_numeric(df["Price"], errors="coerce").astype("float32")
+    df["Brand"] = df["Brand"].astype("category")
+    if "Currency" in df.columns:
+        df["Currency"] = df["Currency"].astype("category")
+    return df
+
+
+def build_brand_index(df: pd.DataFrame) -> pd.DataFrame:
     """
-    # Get absolute path to dataset directory
-    base_dir = os.path.dirname(
-        os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    Add a categorical Brand_Key column holding the normalized brand and
+    sort the rows by brand and date, so every brand occupies one
+    contiguous block ordered by Item_Date.
+    """
+    df["Brand_Key"] = (
+        df["Brand"].astype("string").str.strip().str.lower().astype("category")
     )
-    dataset_path = os.path.join(base_dir, "dataset", "*.csv")
-    print(dataset_path)
+    # Missing brands (code -1) go first so the category codes stay sorted,
+    # missing dates (NaT) go last within a brand as numpy expects
+    dates = df["Item_Date"].to_numpy().view("int64").copy()
+    dates[df["Item_Date"].isna().to_numpy()] = np.iinfo(np.int64).max
+    order = np.lexsort((dates, df["Brand_Key"].cat.codes.to_numpy()))
+    return df.take(order).reset_index(drop=True)
 
-    # Get all CSV files from dataset folder
-    csv_files = glob.glob(dataset_path)
 
-    if not csv_files:
-        print(f"No CSV files found in {dataset_path}")
-        return pd.DataFrame()
+def get_brand_items(df: pd.DataFrame, brand: str) -> pd.DataFrame:
+    """
+    Return the rows of a brand as a zero-copy slice of the frame.
+    Relies on the ordering produced by build_brand_index.
+    """
+    if df.empty:
+        return df
+
+    brand_keys = df["Brand_Key"].cat
+    try:
+        code = brand_keys.categories.get_loc(normalize_brand(brand))
+    except KeyError:
+        return df.iloc[0:0]
+
+    # Codes are sorted, so the brand block is found by binary search
+    start, stop = np.searchsorted(brand_keys.codes.to_numpy(), [code, code + 1])
+    return df.iloc[start:stop]
+
+
+def get_row_range(items: pd.DataFrame) -> tuple[int, int]:
+    """
+    Return the row positions covered by a contiguous slice of the loaded
+    frame. load_data resets the index, so labels equal positions.
+    """
+    if items.empty:
+        return 0, 0
+    return int(items.index[0]), int(items.index[-1]) + 1
+
+
+def get_prices(items: pd.DataFrame) -> pd.Series:
+    """
+    Return prices widened to float64 for aggregation. float32 can't store
+    cents exactly, so values are snapped back to two decimals first to
+    keep means identical to the CSV values.
+    """
+    return items["Price"].astype("float64").round(2)
+
+
+def get_date_range(
+    items: pd.DataFrame,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Restrict date-sorted rows (e.g. a brand slice) to an inclusive date
+    range using binary search instead of a boolean mask.
+    """
+    start = 0
+    stop = len(items)
+    if start_date:
+        start = items["Item_Date"].searchsorted(pd.to_datetime(start_date), side="left")
+    if end_date:
+        stop = items["Item_Date"].searchsorted(pd.to_datetime(end_date), side="right")
+    return items.iloc[start:max(start, stop)]
+
+
+def load_store() -> pd.DataFrame:
+    """
+    Read the columnar store, projecting only the columns in LOAD_COLUMNS.
+    Rows are already typed and deduplicated on ID by the ingest step.
+    """
+    print(f"Loading columnar store from {STORE_DIR}")
+    df = pd.read_parquet(STORE_DIR, columns=LOAD_COLUMNS, engine="pyarrow")
 
-    # Create empty list to store dataframes
-    dfs = []
+    pending = get_pending_sources()
+    if pending:
+        print(
+            f"{len(pending)} crawler files are not ingested yet, run "
+            "python -m src.backend.modules.dataset_store"
+        )
 
-    # Read each CSV file and append to list
-    for file in csv_files:
+    df = normalize_schema(df)
+    df = build_brand_index(df)
+    print(f"Final DataFrame columns: {df.columns.tolist()}")
+    return df
+
+
+def read_manifest() -> dict:
+    """Read the store manifest, which records the CSVs already ingested."""
+    if not has_store():
+        return {"sources": {}}
+    with open(STORE_MANIFEST) as f:
+        return json.load(f)
+
+
+def get_pending_sources() -> list[str]:
+    """Return the crawler files that are new or changed since they were ingested."""
+    sources = read_manifest()["sources"]
+    pending = []
+    for file in get_source_files():
+        stat = os.stat(file)
+        source = sources.get(os.path.basename(file))
+        if (
+            source is None
+            or source["size"] != stat.st_size
+            or source["mtime_ns"] != stat.st_mtime_ns
+        ):
+            pending.append(file)
+    return pending
+
+
+def count_rows(file: str) -> int:
+    """
+    Upper bound for the rows of a crawler file: the row count in the
+    footer of a Parquet file, the number of lines of a CSV.
+    """
+    if file.endswith(".parquet"):
+        return pq.ParquetFile(file).metadata.num_rows
+
+    lines = 1
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+    return lines
+
+
+def join_labels(table: pa.Table) -> pa.Table:
+    """
+    Turn the label lists of a crawler Parquet table into space separated
+    text like in the CSV files. Joined by Arrow, not row by row; empty
+    lists become nulls.
+    """
+    for column in LIST_COLUMNS:
+        if column not in table.column_names or not pa.types.is_list(table[column].type):
+            continue
+        joined = pc.binary_join(table[column], " ")
+        joined = pc.if_else(pc.equal(joined, ""), pa.scalar(None, pa.string()), joined)
+        table = table.set_column(table.column_names.index(column), column, joined)
+    return table
+
+
+def read_parquet_chunks(file: str, columns: list[str]):
+    """Stream the given columns of a crawler Parquet file as frames."""
+    parquet = pq.ParquetFile(file)
+    columns = [column for column in columns if column in parquet.schema_arrow.names]
+    for batch in parquet.iter_batches(batch_size=CHUNK_ROWS, columns=columns):
+        yield join_labels(pa.Table.from_batches([batch])).to_pandas()
+
+
+def read_source_chunks(file: str):
+    """
+    Stream a crawler CSV or Parquet file in chunks of CHUNK_ROWS rows,
+    reading only LOAD_COLUMNS. Yields the chunks with typed ID, Price and
+    Item_Date columns; rows without a numeric ID are dropped.
+    """
+    if file.endswith(".parquet"):
+        chunks = read_parquet_chunks(file, LOAD_COLUMNS)
+    else:
+        chunks = pd.read_csv(
+            file,
+            usecols=lambda column: column in LOAD_COLUMNS,
+            dtype={column: str for column in TEXT_COLUMNS + ["Item_Date"]},
+            chunksize=CHUNK_ROWS,
+        )
+    for chunk in chunks:
+        # Older crawls lack some columns, e.g. Currency
+        chunk = chunk.reindex(columns=LOAD_COLUMNS)
+        chunk["ID"] = pd.to_numeric(chunk["ID"], errors="coerce")
+        chunk = chunk.dropna(subset=["ID"])
+        chunk["ID"] = chunk["ID"].astype("int64")
+        chunk["Price"] = pd.to_numeric(chunk["Price"], errors="coerce").astype("float32")
+        chunk["Item_Date"] = pd.to_datetime(chunk["Item_Date"], errors="coerce")
+        yield chunk
+
+
+def _first_seen(chunk: pd.DataFrame, seen: set, added: set) -> np.ndarray:
+    """
+    Mark the rows whose DEDUP_KEY is neither in seen nor in added yet,
+    adding their keys to added.
+    """
+    ids = chunk["ID"].to_numpy().tolist()
+    days = chunk["Item_Date"].to_numpy().view("int64").tolist()
+    keep = np.zeros(len(ids), dtype=bool)
+    for i, key in enumerate(zip(ids, days)):
+        if key not in seen and key not in added:
+            added.add(key)
+            keep[i] = True
+    return keep
+
+
+def load_source_files(files: list[str]) -> pd.DataFrame:
+    """
+    Stream crawler files into one frame deduplicated on DEDUP_KEY, keeping the
+    first row of every listing day. Rows are appended to columns
+    preallocated for the line count of the files, so no intermediate
+    frames are kept and peak memory stays close to the final frame.
+    """
+    capacity = sum(count_rows(file) for file in files)
+    columns = {
+        "ID": np.empty(capacity, dtype="int64"),
+        "Price": np.empty(capacity, dtype="float32"),
+        "Item_Date": np.empty(capacity, dtype="datetime64[ns]"),
+    }
+    for column in TEXT_COLUMNS:
+        columns[column] = np.empty(capacity, dtype=object)
+
+    seen = set()
+    size = 0
+    for file in files:
+        start = size
+        added = set()
+        try:
+            for chunk in read_source_chunks(file):
+                chunk = chunk[_first_seen(chunk, seen, added)]
+                stop = size + len(chunk)
+                for column, values in columns.items():
+                    values[size:stop] = chunk[column].to_numpy()
+                size = stop
+        except Exception as e:
+            # Drop the rows read before the error, like a file that fails to open
+            print(f"Error loading {file}: {str(e)}")
+            size = start
+            continue
+        seen |= added
+        print(f"Successfully loaded {file}")
+
+    return pd.DataFrame(
+        {column: columns[column][:size] for column in LOAD_COLUMNS}, copy=False
+    )
+
+
+def read_dataset_file(file: str) -> pd.DataFrame:
+    """Read one store partition or crawler file with its analysis types."""
+    # Partitions sit in STORE_DIR/month=.../, crawler files in DATASET_DIR
+    if os.path.dirname(os.path.dirname(file)) == STORE_DIR:
+        df = pd.read_parquet(file, columns=LOAD_COLUMNS, engine="pyarrow")
+    else:
+        df = load_source_files([file])
+    return normalize_schema(df)
+
+
+def load_delta(df: pd.DataFrame, files: list[str]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Append the rows of newly added dataset files to a frame returned by
+    load_data, without reading the files it was loaded from again.
+    Returns the combined frame and, in the same layout, the rows that were
+    actually added, so indexes can be updated from those alone.
+    """
+    frames = []
+    for file in files:
         try:
-            df = pd.read_csv(file)
-            dfs.append(df)
+            frames.append(read_dataset_file(file))
             print(f"Successfully loaded {file}")
         except Exception as e:
             print(f"Error loading {file}: {str(e)}")
+    if not frames:
+        return df, df.iloc[0:0]
 
-    # Concatenate all dataframes
-    if dfs:
-        combined_df = pd.concat(dfs, ignore_index=True)
-        # Remove duplicates based on all columns
-        combined_df = combined_df.drop_duplicates()
-        print(f"Final DataFrame columns: {combined_df.columns.tolist()}")
-        return combined_df
+    combined = pd.concat(
+        [df.drop(columns="Brand_Key", errors="ignore"), *frames], ignore_index=True
+    )
+    # Categories differ between the parts, so cast the columns again
+    combined = normalize_schema(combined)
+    if not has_store():
+        # Same de-duplication as load_data, the store is deduplicated on ingest
+        combined = combined.drop_duplicates(subset=DEDUP_KEY)
+    # De-duplication keeps the index, rows past the old frame are new
+    added = combined[combined.index >= len(df)].copy()
+    return build_brand_index(combined), build_brand_index(added)
+
+
+def load_data() -> pd.DataFrame:
+    """
+    Load and process the dataset. Reads the columnar store if the crawler
+    files have been ingested, otherwise streams every crawler CSV and
+    Parquet file from the dataset folder. Returns a pandas DataFrame with one row per listing and day.
+    """
+    if has_store():
+        return load_store()
+
+    print(DATASET_DIR)
+
+    # Get all crawler files from dataset folder
+    source_files = get_source_files()
+
+    if not source_files:
+        print(f"No CSV or Parquet files found in {DATASET_DIR}")
+        return pd.DataFrame()
+
+    df = load_source_files(source_files)
+    if df.empty:
+        return pd.DataFrame()
 
-    return pd.DataFrame()
+    df = normalize_schema(df)
+    df = build_brand_index(df)
+    print(f"Final DataFrame columns: {df.columns.tolist()}")
+    return df
@@ -0,0 +1,165 @@
+import glob
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.backend.modules.array_store import file_lock
+from src.backend.modules.data_loader import (
+    DATASET_DIR,
+    DEDUP_KEY,
+    STORE_DIR,
+    STORE_MANIFEST,
+    get_pending_sources,
+    join_labels,
+    read_manifest,
+)
+
+# Fixed schema of the columnar store, independent of the CSV layout
+STORE_SCHEMA = pa.schema(
+    [
+        ("ID", pa.int64()),
+        ("Photo", pa.string()),
+        ("Title", pa.string()),
+        ("Brand", pa.string()),
+        ("Price", pa.float32()),
+        ("URL", pa.string()),
+        ("Currency", pa.string()),
+        ("Item_Date", pa.timestamp("ns")),
+        ("Colors", pa.string()),
+        ("Materials", pa.string()),
+        ("Styles", pa.string()),
+        ("Categories", pa.string()),
+    ]
+)
+
+TEXT_COLUMNS = [
+    field.name for field in STORE_SCHEMA if field.type == pa.string()
+]
+
+
+def read_source(file: str) -> pd.DataFrame:
+    """Read a crawler CSV or Parquet file and cast it to the store schema."""
+    if file.endswith(".parquet"):
+        # Label lists are stored as space separated text, like in the CSV files
+        df = join_labels(pq.read_table(file)).to_pandas()
+    else:
+        df = pd.read_csv(file, dtype={column: str for column in TEXT_COLUMNS})
+
+    # Older crawls lack some columns, e.g. Currency
+    for column in TEXT_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+
+    df["ID"] = pd.to_numeric(df["ID"], errors="coerce")
+    df = df.dropna(subset=["ID"])
+    df["ID"] = df["ID"].astype("int64")
+    df["Price"] = pd.to_numeric(df["Price"], errors="coerce").astype("float32")
+    df["Item_Date"] = pd.to_datetime(df["Item_Date"], errors="coerce")
+
+    # Keep one row per listing and day
+    df = df.drop_duplicates(subset=DEDUP_KEY)
+    return df[STORE_SCHEMA.names]
+
+
+def _partition_name(month: str, file: str) -> str:
+    stem = os.path.splitext(os.path.basename(file))[0]
+    return os.path.join(f"month={month}", f"{stem}.parquet")
+
+
+def _known_keys(month: str) -> pd.MultiIndex:
+    """Listing keys already stored in a month partition."""
+    files = glob.glob(os.path.join(STORE_DIR, f"month={month}", "*.parquet"))
+    keys = [pd.read_parquet(file, columns=DEDUP_KEY) for file in files]
+    if not keys:
+        return pd.MultiIndex.from_arrays([[], []], names=DEDUP_KEY)
+    return pd.MultiIndex.from_frame(pd.concat(keys, ignore_index=True))
+
+
+def _write_manifest(manifest: dict):
+    # Write to a temporary file first so readers never see a partial manifest
+    tmp_path = f"{STORE_MANIFEST}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, STORE_MANIFEST)
+
+
+def ingest_source(file: str, manifest: dict) -> int:
+    """
+    Convert one CSV into monthly Parquet partitions and record it in the
+    manifest. A changed CSV replaces the partitions it produced before.
+    Listing days already stored from other CSVs are skipped.
+    Returns the number of rows written.
+    """
+    name = os.path.basename(file)
+    previous = set(manifest["sources"].get(name, {}).get("partitions", []))
+
+    df = read_source(file)
+
+    # Drop the partitions from an earlier version of this file
+    for partition in previous:
+        path = os.path.join(STORE_DIR, partition)
+        if os.path.exists(path):
+            os.remove(path)
+
+    months = df["Item_Date"].dt.strftime("%Y-%m").fillna("unknown")
+    partitions = []
+    written = 0
+    for month, rows in df.groupby(months, sort=True):
+        # Duplicates can only exist within the same month partition
+        known = _known_keys(month)
+        rows = rows[~pd.MultiIndex.from_frame(rows[DEDUP_KEY]).isin(known)]
+        if rows.empty:
+            continue
+
+        partition = _partition_name(month, file)
+        path = os.path.join(STORE_DIR, partition)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(rows, schema=STORE_SCHEMA, preserve_index=False)
+        pq.write_table(table, path)
+        partitions.append(partition)
+        written += len(rows)
+
+    stat = os.stat(file)
+    manifest["sources"][name] = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "rows": written,
+        "partitions": partitions,
+    }
+    return written
+
+
+def ingest_dataset() -> dict:
+    """
+    Ingest every new or changed crawler file from the dataset folder into the
+    columnar store. Returns per-file row counts of this run.
+    Runs hold a file lock, so the server's workers and a manual run never
+    ingest at the same time.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    # Parquet readers skip files starting with a dot
+    with file_lock(os.path.join(STORE_DIR, ".ingest.lock")):
+        manifest = read_manifest()
+
+        ingested = {}
+        for file in get_pending_sources():
+            try:
+                ingested[os.path.basename(file)] = ingest_source(file, manifest)
+                # Record progress after each file so an interrupted run resumes
+                _write_manifest(manifest)
+                print(f"Ingested {file}: {ingested[os.path.basename(file)]} new rows")
+            except Exception as e:
+                print(f"Error ingesting {file}: {str(e)}")
+
+        if not os.path.exists(STORE_MANIFEST):
+            _write_manifest(manifest)
+    return ingested
+
+
+if __name__ == "__main__":
+    print(f"Ingesting crawler files from {DATASET_DIR} into {STORE_DIR}...")
+    results = ingest_dataset()
+    print(f"Done! Ingested {len(results)} files, {sum(results.values())} rows")
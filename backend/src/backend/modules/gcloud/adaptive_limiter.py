@@ -0,0 +1,56 @@
+import threading
+import time
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to feedback from the calls it guards,
+    additive increase / multiplicative decrease like TCP. The limit grows
+    by one after each `window` successful calls and is halved when a call
+    fails or, if target_latency is set, takes longer than that.
+    """
+
+    def __init__(
+        self,
+        initial: int = 2,
+        minimum: int = 1,
+        maximum: int = 32,
+        window: int = 10,
+        target_latency: float = None,
+    ):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = window
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until a call may start."""
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, success: bool, latency: float):
+        """Report how a call went and free its slot."""
+        with self._condition:
+            self.in_flight -= 1
+            too_slow = self.target_latency is not None and latency > self.target_latency
+            if success and not too_slow:
+                self._successes += 1
+                if self._successes >= self.window and self.limit < self.maximum:
+                    self.limit += 1
+                    self._successes = 0
+            else:
+                self._successes = 0
+                now = time.monotonic()
+                # Calls in flight during the last decrease report the same
+                # overload, back off only once for them
+                if now - self._last_decrease > latency:
+                    self.limit = max(self.minimum, self.limit // 2)
+                    self._last_decrease = now
+            self._condition.notify_all()
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+CLASSIFIED_COLUMNS = ['Categories', 'Colors', 'Materials', 'Styles']
+
+
+def needs_classification(df):
+    """Boolean mask of the rows with a missing or empty classification column."""
+    mask = np.zeros(len(df), dtype=bool)
+    for column in CLASSIFIED_COLUMNS:
+        if column not in df.columns:
+            return np.ones(len(df), dtype=bool)
+        values = df[column]
+        mask |= values.isna().to_numpy() | (values == '').to_numpy()
+    return mask
+
+
+class ClassificationStore:
+    """
+    Append-only SQLite store for classification results, keyed by listing
+    ID. Results are buffered and written in batches, and only merged into
+    the CSV files once at the end of a run. Each result is marked once it
+    has been merged, so later runs leave it alone.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100):
+        self.path = path
+        self.batch_size = batch_size
+        self._buffer = []
+        # Shared by the worker threads, every access holds the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS classifications ("
+                "id TEXT PRIMARY KEY, categories TEXT, colors TEXT, materials TEXT, styles TEXT, "
+                "merged INTEGER NOT NULL DEFAULT 0)"
+            )
+            # Stores written before results were marked count as not merged
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(classifications)")}
+            if 'merged' not in columns:
+                self._db.execute(
+                    "ALTER TABLE classifications ADD COLUMN merged INTEGER NOT NULL DEFAULT 0"
+                )
+
+    def add(self, item_id, categories: str, colors: str, materials: str, styles: str):
+        """Queue the result for one listing, writing a batch when it is full."""
+        with self._lock:
+            self._buffer.append((str(item_id), categories, colors, materials, styles))
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO classifications "
+                "(id, categories, colors, materials, styles, merged) VALUES (?, ?, ?, ?, ?, 0)",
+                self._buffer,
+            )
+        self._buffer = []
+
+    def classified_ids(self) -> set:
+        """IDs with a stored result, including ones not merged into the CSVs yet."""
+        self.flush()
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT id FROM classifications")}
+
+    def unmerged_results(self) -> pd.DataFrame:
+        """
+        Results not merged into the CSVs yet, those of this run and of
+        interrupted earlier runs, indexed by ID with the CSV column names.
+        """
+        self.flush()
+        with self._lock:
+            df = pd.read_sql_query(
+                "SELECT id, categories, colors, materials, styles "
+                "FROM classifications WHERE merged = 0",
+                self._db,
+            )
+        df.columns = ['ID'] + CLASSIFIED_COLUMNS
+        return df.set_index('ID')
+
+    def mark_merged(self, ids):
+        """Mark results as merged so later runs don't merge them again."""
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE classifications SET merged = 1 WHERE id = ?", [(str(i),) for i in ids]
+            )
+
+    def merge_into_csv(self, csv_file: str, results: pd.DataFrame = None) -> int:
+        """
+        Write results into the rows of a CSV with the same ID that still
+        need a classification, reading the file once. Rows classified
+        already are left as they are, and a file without such rows is not
+        rewritten. Returns the number of rows updated.
+        """
+        if results is None:
+            results = self.unmerged_results()
+        if results.empty:
+            return 0
+        df = pd.read_csv(csv_file)
+        ids = df['ID'].astype(str)
+        matched = ids.isin(results.index).to_numpy() & needs_classification(df)
+        if not matched.any():
+            return 0
+
+        for column in CLASSIFIED_COLUMNS:
+            if column not in df.columns:
+                df[column] = None
+            df[column] = df[column].astype(object)
+            df.loc[matched, column] = ids[matched].map(results[column]).to_numpy()
+
+        # Replace the file in one step so a crash never leaves it half written
+        tmp_file = f"{csv_file}.tmp"
+        df.to_csv(tmp_file, index=False)
+        os.replace(tmp_file, csv_file)
+        return int(matched.sum())
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
@@ -1,9 +1,15 @@
+import numpy as np
 import pandas as pd
+import argparse
 import glob
 import os
-from image_classifier import classify_image
+import random
+import time
+from image_classifier import create_backend
+from classification_store import CLASSIFIED_COLUMNS, ClassificationStore, needs_classification
+from adaptive_limiter import AdaptiveLimiter
 from colorama import init, Fore, Style
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from tqdm import tqdm
 import threading
 
@@ -16,40 +22,37 @@ print_lock = threading.Lock()
 # Define target brands
 TARGET_BRANDS = ['H&M', 'Zara', 'Nike', 'adidas', 'C&A', 'SHEIN', 'ONLY']
 
+# Columns read from the CSV files to plan a run
+PLAN_COLUMNS = ['ID', 'Title', 'Brand'] + CLASSIFIED_COLUMNS
+
 def safe_print(*args, **kwargs):
     """Thread-safe printing function."""
     with print_lock:
         print(*args, **kwargs)
 
-def needs_classification(row):
-    """Check if the row needs classification."""
-    return (
-        pd.isna(row.get('Categories')) or 
-        pd.isna(row.get('Colors')) or 
-        pd.isna(row.get('Materials')) or 
-        pd.isna(row.get('Styles')) or
-        row.get('Categories') == '' or 
-        row.get('Colors') == '' or 
-        row.get('Materials') == '' or 
-        row.get('Styles') == ''
-    )
+def classify_with_retries(backend, limiter, title, image_path, attempts=4):
+    """Classify one image under the concurrency limit, retrying failures with backoff."""
+    for attempt in range(attempts):
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            classification = backend.classify(title, image_path)
+        except Exception as e:
+            limiter.release(False, time.monotonic() - start)
+            if attempt == attempts - 1:
+                raise
+            delay = min(30, 2 ** attempt) * random.uniform(0.5, 1.0)
+            safe_print(f"{Fore.YELLOW}{str(e)}, retrying in {delay:.1f}s{Style.RESET_ALL}")
+            time.sleep(delay)
+            continue
+        limiter.release(True, time.monotonic() - start)
+        return classification
 
-def process_row(row, image_dirs, csv_file, df_lock):
+def process_row(item_id, title, brand, image_path, store, backend, limiter):
     """Process a single row with image classification."""
     try:
-        # Skip if already classified
-        if not needs_classification(row):
-            safe_print(f"{Fore.BLUE}Skipping ID {row['ID']}: Already classified{Style.RESET_ALL}")
-            return True, row['ID']  # Count as success but skip processing
-        
-        # Find image file
-        image_path = find_image(str(row['ID']), image_dirs)
-        if not image_path:
-            safe_print(f"{Fore.YELLOW}Image not found for ID: {row['ID']}{Style.RESET_ALL}")
-            return False, row['ID']
-        
         # Classify image
-        classification = classify_image(row['Title'], image_path)
+        classification = classify_with_retries(backend, limiter, title, image_path)
         
         # Prepare classifications
         categories = ' '.join(str(classification['categories']).split(','))
@@ -57,109 +60,154 @@ def process_row(row, image_dirs, csv_file, df_lock):
         materials = ' '.join(classification['materials'])
         styles = ' '.join(classification['styles'])
         
-        # Update CSV with thread safety
-        with df_lock:
-            df = pd.read_csv(csv_file)
-            df.loc[df['ID'] == row['ID'], 'Categories'] = categories
-            df.loc[df['ID'] == row['ID'], 'Colors'] = colors
-            df.loc[df['ID'] == row['ID'], 'Materials'] = materials
-            df.loc[df['ID'] == row['ID'], 'Styles'] = styles
-            df.to_csv(csv_file, index=False)
+        # Store the result, merged into the CSV files at the end of the run
+        store.add(item_id, categories, colors, materials, styles)
         
-        safe_print(f"\n{Fore.GREEN}Processed ID: {row['ID']}{Style.RESET_ALL}")
-        safe_print(f"Brand: {row['Brand']}")
-        safe_print(f"Title: {row['Title']}")
+        safe_print(f"\n{Fore.GREEN}Processed ID: {item_id}{Style.RESET_ALL}")
+        safe_print(f"Brand: {brand}")
+        safe_print(f"Title: {title}")
         safe_print(f"Categories: {Fore.CYAN}{categories}{Style.RESET_ALL}")
         safe_print(f"Colors: {Fore.CYAN}{colors}{Style.RESET_ALL}")
         safe_print(f"Materials: {Fore.CYAN}{materials}{Style.RESET_ALL}")
         safe_print(f"Styles: {Fore.CYAN}{styles}{Style.RESET_ALL}")
         safe_print("-" * 80)
         
-        return True, row['ID']
+        return True, item_id
         
     except Exception as e:
-        safe_print(f"{Fore.RED}Error processing ID {row['ID']}: {str(e)}{Style.RESET_ALL}")
-        return False, row['ID']
+        safe_print(f"{Fore.RED}Error processing ID {item_id}: {str(e)}{Style.RESET_ALL}")
+        return False, item_id
+
+def read_target_rows(csv_file):
+    """Read the columns planning needs, keeping only rows of TARGET_BRANDS."""
+    df = pd.read_csv(
+        csv_file,
+        usecols=lambda column: column in PLAN_COLUMNS,
+        dtype={'Brand': 'category', 'Title': str, **{c: str for c in CLASSIFIED_COLUMNS}},
+    )
+    # Compare small category codes instead of every brand string
+    brands = df['Brand'].cat
+    target_codes = brands.categories.get_indexer(TARGET_BRANDS)
+    is_target = np.isin(brands.codes.to_numpy(), target_codes[target_codes >= 0])
+    return df[is_target]
+
+def plan_work(csv_files, classified_ids, image_index):
+    """
+    Decide what to classify across all CSV files at once. Returns the work
+    queue as parallel ID, title and brand arrays, one entry per listing,
+    plus counts for the statistics.
+    """
+    frames = []
+    for csv_file in csv_files:
+        try:
+            frames.append(read_target_rows(csv_file))
+        except Exception as e:
+            safe_print(f"{Fore.RED}Error processing {csv_file}: {str(e)}{Style.RESET_ALL}")
+    if not frames:
+        empty = np.array([], dtype=object)
+        return (empty, empty, empty), 0, 0
+
+    df = pd.concat(frames, ignore_index=True)
+    safe_print(f"Found {len(df)} items from target brands")
+
+    # Unclassified rows, minus results stored but not merged yet
+    ids = df['ID'].astype(str)
+    to_process = needs_classification(df) & ~ids.isin(classified_ids).to_numpy()
+    already_classified = int(len(df) - to_process.sum())
+
+    # A listing crawled on several days is classified once
+    df = df[to_process].assign(ID=ids[to_process]).drop_duplicates('ID')
+
+    # Rows without an image can't be classified, skip them up front
+    has_image = np.fromiter((i in image_index for i in df['ID']), dtype=bool, count=len(df))
+    missing_images = int((~has_image).sum())
+    df = df[has_image]
 
-def process_csv_file(csv_file, image_dirs):
-    """Process a single CSV file."""
-    safe_print(f"\n{Fore.CYAN}Processing {csv_file}...{Style.RESET_ALL}")
-    df = pd.read_csv(csv_file)
-    
-    # Filter for target brands
-    df_filtered = df[df['Brand'].isin(TARGET_BRANDS)]
-    
-    if df_filtered.empty:
-        safe_print(f"{Fore.YELLOW}No target brands found in {csv_file}{Style.RESET_ALL}")
-        return 0, 0, 0
-    
-    # Filter for unclassified items
-    df_to_process = df_filtered[df_filtered.apply(needs_classification, axis=1)]
-    already_classified = len(df_filtered) - len(df_to_process)
-    
-    safe_print(f"Found {len(df_filtered)} items from target brands")
     safe_print(f"Already classified: {already_classified}")
-    safe_print(f"To be processed: {len(df_to_process)}")
-    
-    if df_to_process.empty:
-        safe_print(f"{Fore.GREEN}All items already classified in {csv_file}{Style.RESET_ALL}")
-        return 0, 0, already_classified
-        
-    # Create a thread-safe lock for DataFrame operations
-    df_lock = threading.Lock()
-    
+    safe_print(f"Images not found: {missing_images}")
+    safe_print(f"To be processed: {len(df)}")
+
+    queue = (
+        df['ID'].to_numpy(dtype=object),
+        df['Title'].to_numpy(dtype=object),
+        df['Brand'].astype(str).to_numpy(dtype=object),
+    )
+    return queue, already_classified, missing_images
+
+def run_pipeline(queue, image_index, store, backend, limiter):
+    """
+    Classify the queued listings on one pool shared by all CSV files. The
+    limiter decides how many classifier calls run at once; only a bounded
+    number of listings is submitted ahead of it.
+    """
+    ids, titles, brands = queue
     processed = 0
     skipped = 0
     
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = [
-            executor.submit(process_row, row, image_dirs, csv_file, df_lock)
-            for _, row in df_to_process.iterrows()
-        ]
+    with ThreadPoolExecutor(max_workers=limiter.maximum) as executor, \
+            tqdm(total=len(ids), desc="Classifying") as pbar:
+        pending = set()
         
-        with tqdm(total=len(futures), desc=f"Processing {os.path.basename(csv_file)}") as pbar:
-            for future in as_completed(futures):
+        def collect(done):
+            nonlocal processed, skipped
+            for future in done:
                 success, _ = future.result()
                 if success:
                     processed += 1
                 else:
                     skipped += 1
                 pbar.update(1)
+            pbar.set_postfix(concurrency=limiter.limit)
+        
+        for i in range(len(ids)):
+            if len(pending) >= 2 * limiter.maximum:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(
+                process_row, ids[i], titles[i], brands[i], image_index[ids[i]], store, backend, limiter
+            ))
+        collect(pending)
     
-    return processed, skipped, already_classified
+    return processed, skipped
 
-def process_dataset():
-    """Process all CSV files concurrently."""
-    csv_files = glob.glob("backend/dataset/*.csv")
+def process_dataset(
+    backend,
+    dataset_dir="backend/dataset",
+    initial_concurrency=2,
+    max_concurrency=16,
+    target_latency=None,
+):
+    """Classify the listings of all CSV files in one pipeline."""
+    csv_files = glob.glob(os.path.join(dataset_dir, "*.csv"))
     
     image_dirs = [
-        "backend/dataset/images",
-        "backend/dataset/images_between",
-        "backend/dataset/images_rest"
+        os.path.join(dataset_dir, "images"),
+        os.path.join(dataset_dir, "images_between"),
+        os.path.join(dataset_dir, "images_rest")
     ]
+    # Look up every image once instead of probing the directories per row
+    image_index = load_image_index(image_dirs)
+    safe_print(f"Indexed {len(image_index)} images")
+
+    # Results of this and earlier interrupted runs. Stored results are the
+    # checkpoint, a restarted run skips them
+    store = ClassificationStore(os.path.join(dataset_dir, "classifications.sqlite"))
+    classified_ids = store.classified_ids()
     
-    total_processed = 0
-    total_skipped = 0
-    total_already_classified = 0
+    queue, total_already_classified, missing_images = plan_work(csv_files, classified_ids, image_index)
     
-    # Process all CSV files concurrently with 2 workers per file
-    with ThreadPoolExecutor(max_workers=len(csv_files)) as executor:
-        # Submit all CSV files for processing
-        future_to_csv = {
-            executor.submit(process_csv_file, csv_file, image_dirs): csv_file 
-            for csv_file in csv_files
-        }
-        
-        # Collect results as they complete
-        for future in as_completed(future_to_csv):
-            csv_file = future_to_csv[future]
-            try:
-                processed, skipped, already_classified = future.result()
-                total_processed += processed
-                total_skipped += skipped
-                total_already_classified += already_classified
-            except Exception as e:
-                safe_print(f"{Fore.RED}Error processing {csv_file}: {str(e)}{Style.RESET_ALL}")
+    limiter = AdaptiveLimiter(
+        initial=initial_concurrency, maximum=max_concurrency, target_latency=target_latency
+    )
+    try:
+        total_processed, total_skipped = run_pipeline(queue, image_index, store, backend, limiter)
+        total_skipped += missing_images
+    finally:
+        store.flush()
+
+    # Merge the new results into the CSV files, rewriting each file at most once
+    merge_results(store, csv_files)
+    store.close()
     
     # Print final statistics
     safe_print(f"\n{Fore.CYAN}=== Final Statistics ==={Style.RESET_ALL}")
@@ -169,18 +217,80 @@ def process_dataset():
     if total_processed + total_skipped > 0:
         safe_print(f"Success rate: {(total_processed/(total_processed+total_skipped))*100:.2f}%")
 
-def find_image(image_id: str, directories: list) -> str:
-    """Find image file in multiple directories."""
-    image_filename = f"{image_id}.jpeg"
-    
-    for directory in directories:
-        image_path = os.path.join(directory, image_filename)
-        if os.path.exists(image_path):
-            return image_path
-    
-    return None
+def merge_results(store, csv_files):
+    """
+    Write the results not merged yet into the CSV rows that still need a
+    classification. They are marked merged once every file took them, so
+    a file that failed gets them again on the next run.
+    """
+    results = store.unmerged_results()
+    if results.empty:
+        safe_print("No new classification results to merge")
+        return
+    failed = False
+    for csv_file in csv_files:
+        try:
+            updated = store.merge_into_csv(csv_file, results)
+            if updated:
+                safe_print(f"Merged {updated} classified rows into {csv_file}")
+        except Exception as e:
+            failed = True
+            safe_print(f"{Fore.RED}Error merging into {csv_file}: {str(e)}{Style.RESET_ALL}")
+    if not failed:
+        store.mark_merged(results.index)
+
+def load_image_index(directories: list) -> dict:
+    """
+    Map item IDs to image paths across multiple directories, reading each
+    directory once. Image stores written by the crawler are read from
+    their manifest.tsv, plain {ID}.jpeg files are found by listing the
+    directory. Earlier directories take precedence.
+    """
+    index = {}
+    for directory in reversed(directories):
+        if not os.path.isdir(directory):
+            continue
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                item_id, ext = os.path.splitext(entry.name)
+                if ext == ".jpeg":
+                    index[item_id] = entry.path
+
+        manifest = os.path.join(directory, "manifest.tsv")
+        if os.path.exists(manifest):
+            with open(manifest, encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    # item_id, sha256, ext; skip a line cut short by a crash
+                    if len(parts) == 3 and len(parts[1]) == 64:
+                        item_id, digest, ext = parts
+                        index[item_id] = os.path.join(
+                            directory, "objects", digest[:2], digest[2:4], f"{digest}{ext}"
+                        )
+    return index
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Classify the listings of the dataset CSV files')
+    parser.add_argument('--backend', default='vertex', choices=['vertex', 'stub'], help='Classifier backend')
+    parser.add_argument('--dataset-dir', default='backend/dataset', help='Folder with the CSV files and images')
+    parser.add_argument('--initial-concurrency', type=int, default=2)
+    parser.add_argument('--max-concurrency', type=int, default=16)
+    parser.add_argument('--target-latency', type=float, help='Back off when a call takes longer (seconds)')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='Simulated latency of the stub backend')
+    parser.add_argument('--stub-failure-rate', type=float, default=0.0, help='Share of failed stub calls')
+    args = parser.parse_args()
+
+    if args.backend == 'stub':
+        backend = create_backend('stub', latency=args.stub_latency, failure_rate=args.stub_failure_rate)
+    else:
+        backend = create_backend(args.backend)
+
     print(f"{Fore.CYAN}Starting concurrent dataset classification...{Style.RESET_ALL}")
-    process_dataset()
-    print(f"{Fore.GREEN}Classification complete!{Style.RESET_ALL}")
\ No newline at end of file
+    process_dataset(
+        backend,
+        dataset_dir=args.dataset_dir,
+        initial_concurrency=args.initial_concurrency,
+        max_concurrency=args.max_concurrency,
+        target_latency=args.target_latency,
+    )
+    print(f"{Fore.GREEN}Classification complete!{Style.RESET_ALL}")
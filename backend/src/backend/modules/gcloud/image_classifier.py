@@ -1,21 +1,47 @@
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel, Image
+import hashlib
 import os
 import json
+import random
+import time
+from abc import ABC, abstractmethod
 
 MODEL_ID = "gemini-1.5-flash-002"
 
-vertexai.init(project="aihack24ber-8510", location="europe-west2")
 
-generative_multimodal_model = GenerativeModel("gemini-1.5-flash-002")
+class ClassifierBackend(ABC):
+    """Classifies a listing from its title and image path."""
 
-def classify_image(title: str, image_path: str):
-    image = Image.load_from_file(image_path)
+    name = "base"
+
+    @abstractmethod
+    def classify(self, title: str, image_path: str) -> dict:
+        """
+        Return {"categories": str, "colors": [str], "materials": [str],
+        "styles": [str]}. Raise on transient failures so they are retried.
+        """
+
+
+class VertexClassifier(ClassifierBackend):
+    """Gemini on Vertex AI."""
+
+    name = "vertex"
+
+    def __init__(self, project: str = "aihack24ber-8510", location: str = "europe-west2"):
+        import vertexai
+        from vertexai.preview.generative_models import GenerativeModel
+
+        vertexai.init(project=project, location=location)
+        self.model = GenerativeModel(MODEL_ID)
+
+    def classify(self, title: str, image_path: str) -> dict:
+        from vertexai.preview.generative_models import Image
 
-    prompt = f"""
+        image = Image.load_from_file(image_path)
+
+        prompt = f"""
     I am trying to make listings of second hand searchable, to do this I need you to classify the clothing items based on their title and image.
     Try to get multiple categories, colors, materials and styles.
-    
+
     Analyze the image and title, then return a JSON object with the following structure:
     {{
         "categories": "string",  // Main categories like "Shoes", "Tops", "Bottoms", "Dresses", "Outerwear", "Accessories" and others. Try to find other categories if possible.
@@ -23,33 +49,86 @@ def classify_image(title: str, image_path: str):
         "materials": ["string"],  // Array of materials like "Leather", "Cotton", "Denim"
         "styles": ["string"]  // Array of styles descriptors like "Casual", "Formal", "Sporty", try to get multiple styles if possible and other styles if possible.
     }}
-    
+
     The title is: {title}
-    
+
     Return ONLY valid JSON, no additional text.
     """
 
-    response = generative_multimodal_model.generate_content(
-        [prompt, image],
-        generation_config={
-            "temperature": 0.1,  # Lower temperature for more consistent output
-            "top_p": 0.8,
-            "top_k": 40
-        }
-    )
-
-    try:
-        # Parse the response to ensure it's valid JSON
-        # Remove any markdown formatting if present
-        clean_response = response.text.replace("```json", "").replace("```", "").strip()
-        categories = json.loads(clean_response)
-        return categories
-    except json.JSONDecodeError:
-        print(f"Error parsing JSON: {response.text}")
-        # Fallback if response isn't valid JSON
+        response = self.model.generate_content(
+            [prompt, image],
+            generation_config={
+                "temperature": 0.1,  # Lower temperature for more consistent output
+                "top_p": 0.8,
+                "top_k": 40
+            }
+        )
+
+        try:
+            # Parse the response to ensure it's valid JSON
+            # Remove any markdown formatting if present
+            clean_response = response.text.replace("```json", "").replace("```", "").strip()
+            categories = json.loads(clean_response)
+            return categories
+        except json.JSONDecodeError:
+            print(f"Error parsing JSON: {response.text}")
+            # Fallback if response isn't valid JSON
+            return {
+                "categories": "Other",
+                "colors": [],
+                "materials": [],
+                "styles": []
+            }
+
+
+class StubClassifier(ClassifierBackend):
+    """
+    Deterministic offline classifier for testing and benchmarking the
+    pipeline: the same title always gets the same labels. Optionally
+    simulates service latency and a share of failed calls.
+    """
+
+    name = "stub"
+
+    CATEGORIES = ["Tops", "Bottoms", "Shoes", "Dresses", "Outerwear", "Accessories"]
+    COLORS = ["Black", "White", "Blue", "Red", "Green", "Beige"]
+    MATERIALS = ["Cotton", "Denim", "Leather", "Polyester", "Wool"]
+    STYLES = ["Casual", "Sporty", "Formal", "Vintage", "Streetwear"]
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def classify(self, title: str, image_path: str) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Simulated classifier failure")
+
+        rng = random.Random(hashlib.sha256(str(title).encode()).digest())
         return {
-            "categories": "Other",
-            "colors": [],
-            "materials": [],
-            "styles": []
+            "categories": rng.choice(self.CATEGORIES),
+            "colors": rng.sample(self.COLORS, 2),
+            "materials": rng.sample(self.MATERIALS, 1),
+            "styles": rng.sample(self.STYLES, 2),
         }
+
+
+def create_backend(name: str, **options) -> ClassifierBackend:
+    """Create a classifier backend by name: "vertex" or "stub"."""
+    if name == "vertex":
+        return VertexClassifier(**options)
+    if name == "stub":
+        return StubClassifier(**options)
+    raise ValueError(f"Unknown classifier backend: {name}")
+
+
+_default_backend = None
+
+
+def classify_image(title: str, image_path: str):
+    """Classify with Vertex AI, or the backend named in CLASSIFIER_BACKEND."""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = create_backend(os.environ.get("CLASSIFIER_BACKEND", "vertex"))
+    return _default_backend.classify(title, image_path)
@@ -1,83 +1,301 @@
+from dataclasses import dataclass
 from urllib.parse import unquote
+import numpy as np
 import pandas as pd
-from collections import Counter
 import re
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from src.backend.modules.array_store import (
+    load_array,
+    load_index,
+    load_sparse,
+    save_arrays,
+    save_index,
+    save_sparse,
+)
+from src.backend.modules.data_loader import (
+    get_brand_items,
+    get_prices,
+    get_row_range,
+    normalize_brand,
+)
+
+RELEVANT_COLUMNS = ['Title', 'Categories', 'Colors', 'Materials', 'Styles']
+
+# Common stop words
+STOP_WORDS = {'the', 'and', 'for', 'with', 'neu', 'wie', 'von', 'aus', 'größe', 'mit'}
+
+def _remove_digits(text: str) -> str:
+    return re.sub(r'\d+', '', text.lower())
+
+def combined_text(df: pd.DataFrame) -> pd.Series:
+    """Join all relevant columns of each listing into one lowercase string"""
+    text = df[RELEVANT_COLUMNS[0]].fillna('').astype(str)
+    for col in RELEVANT_COLUMNS[1:]:
+        text = text + ' ' + df[col].fillna('').astype(str)
+    return text.str.lower()
 
 def clean_text(text: str) -> list[str]:
     """Clean and tokenize text"""
     if not isinstance(text, str):
         return []
         
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Remove specific patterns
-    text = re.sub(r'\d+', '', text)
+    # Convert to lowercase and remove specific patterns
+    text = _remove_digits(text)
     
     # Split into words and remove short words
     words = [word for word in re.findall(r'\w+', text) if len(word) > 2]
     
     # Remove common stop words
-    stop_words = {'the', 'and', 'for', 'with', 'neu', 'wie', 'von', 'aus', 'größe', 'mit'}
-    return [w for w in words if w not in stop_words]
+    return [w for w in words if w not in STOP_WORDS]
+
+@dataclass
+class KeywordIndex:
+    """
+    Keyword counts precomputed at load time. row_counts holds the counts
+    per listing (rows line up with the loaded frame) and brand_counts the
+    totals per brand code, so top keywords are a lookup instead of a scan.
+    """
+    words: np.ndarray
+    row_counts: sparse.csr_matrix
+    brand_keys: pd.Index
+    brand_counts: sparse.csr_matrix
+
+    def top_for_brand(self, brand: str, limit: int = 15) -> list[dict]:
+        """Top keywords of a brand, or [] if the brand is unknown"""
+        try:
+            code = self.brand_keys.get_loc(normalize_brand(brand))
+        except KeyError:
+            return []
+        row = self.brand_counts.getrow(code)
+        return self._top(row.indices, row.data, limit)
+
+    def top_for_rows(self, start: int, stop: int, limit: int = 15) -> list[dict]:
+        """Top keywords over a contiguous range of listing rows"""
+        counts = np.asarray(self.row_counts[start:stop].sum(axis=0)).ravel()
+        columns = np.flatnonzero(counts)
+        return self._top(columns, counts[columns], limit)
+
+    def save(self, path: str):
+        """Write the index to a directory in memory-mappable form"""
+        save_arrays(path, words=self.words)
+        save_sparse(path, 'row_counts', self.row_counts)
+        save_sparse(path, 'brand_counts', self.brand_counts)
+        save_index(path, 'brand_keys', self.brand_keys)
+
+    @classmethod
+    def load(cls, path: str) -> "KeywordIndex":
+        """Map an index written by save"""
+        return cls(
+            words=load_array(path, 'words'),
+            row_counts=load_sparse(path, 'row_counts'),
+            brand_keys=load_index(path, 'brand_keys'),
+            brand_counts=load_sparse(path, 'brand_counts')
+        )
 
-def get_top_keywords(df: pd.DataFrame, brand: str, limit: int = 15) -> list[dict]:
+    def _top(self, columns: np.ndarray, counts: np.ndarray, limit: int) -> list[dict]:
+        if limit <= 0 or len(columns) == 0:
+            return []
+        # Partial selection first, then order the few survivors by count
+        # (ties alphabetically, as the vocabulary is sorted)
+        if len(columns) > limit:
+            keep = np.argpartition(-counts, limit - 1)[:limit]
+            # Include every word tied with the cut-off so ties sort stably
+            keep = np.flatnonzero(counts >= counts[keep].min())
+            columns, counts = columns[keep], counts[keep]
+        order = np.lexsort((columns, -counts))[:limit]
+        return [
+            {"word": str(self.words[c]), "count": int(n)}
+            for c, n in zip(columns[order], counts[order])
+        ]
+
+def build_keyword_index(df: pd.DataFrame) -> KeywordIndex:
+    """
+    Tokenize all relevant columns of every listing in one vectorized pass,
+    with the same rules as clean_text, and sum the counts per brand.
+    """
+    vectorizer = CountVectorizer(
+        preprocessor=_remove_digits,
+        # Words of three or more characters, like clean_text
+        token_pattern=r'(?u)\w{3,}',
+        stop_words=sorted(STOP_WORDS),
+        dtype=np.int32
+    )
+    brand_keys = df['Brand_Key'].cat.categories if not df.empty else pd.Index([])
+    if df.empty:
+        empty = sparse.csr_matrix((0, 0), dtype=np.int32)
+        return KeywordIndex(np.array([], dtype=str), empty, brand_keys, empty)
+
+    try:
+        row_counts = vectorizer.fit_transform(combined_text(df)).tocsr()
+        words = vectorizer.get_feature_names_out().astype(str)
+    except ValueError:
+        # No keywords at all in the dataset
+        row_counts = sparse.csr_matrix((len(df), 0), dtype=np.int32)
+        words = np.array([], dtype=str)
+
+    # Brand membership matrix (brands x rows) to total the counts per brand
+    codes = df['Brand_Key'].cat.codes.to_numpy()
+    rows = np.flatnonzero(codes >= 0)
+    membership = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (codes[rows], rows)),
+        shape=(len(brand_keys), len(df))
+    )
+    brand_counts = (membership @ row_counts).tocsr()
+    brand_counts.sort_indices()
+
+    return KeywordIndex(words, row_counts, brand_keys, brand_counts)
+
+def get_top_keywords(keyword_index: KeywordIndex, brand: str, limit: int = 15) -> list[dict]:
     """Get top keywords from all relevant columns for a specific brand"""
     brand = unquote(brand)
     
-    # Filter for brand
-    brand_items = df[df['Brand'].str.lower() == brand.lower()]
-    
-    if brand_items.empty:
-        return []
-    
-    # Process all relevant columns
-    all_words = []
-    relevant_columns = ['Title', 'Categories', 'Colors', 'Materials', 'Styles']
-    
-    for _, row in brand_items[relevant_columns].iterrows():
-        for col in relevant_columns:
-            all_words.extend(clean_text(row[col]))
-    
-    # Count frequencies
-    word_counts = Counter(all_words)
-    
-    # Get top words
-    top_words = word_counts.most_common(limit)
-    return [{"word": word, "count": count} for word, count in top_words]
+    # Look up the counts precomputed for the brand
+    return keyword_index.top_for_brand(brand, limit)
+
+@dataclass
+class TokenIndex:
+    """
+    Inverted index over the whitespace-separated tokens of the combined
+    text. postings is a rows x tokens CSC matrix, so each column holds the
+    sorted row ids of one token. A second index from character trigrams to
+    tokens finds the tokens containing a keyword, which keeps the substring
+    semantics of `keyword in text`.
+    """
+    tokens: np.ndarray
+    postings: sparse.csc_matrix
+    trigrams: np.ndarray
+    token_trigrams: sparse.csc_matrix
+
+    def matching_tokens(self, keyword: str) -> np.ndarray:
+        """Ids of all tokens that contain the keyword as a substring"""
+        if len(keyword) < 3:
+            # Too short for trigrams, scan the vocabulary instead
+            return np.flatnonzero(np.char.find(self.tokens, keyword) >= 0)
+
+        grams = np.unique([keyword[i:i + 3] for i in range(len(keyword) - 2)])
+        columns = np.searchsorted(self.trigrams, grams)
+        if np.any(columns >= len(self.trigrams)) or np.any(self.trigrams[columns] != grams):
+            # A trigram that occurs nowhere means no token can match
+            return np.array([], dtype=np.int64)
+
+        # Tokens having every trigram of the keyword are candidates
+        hits = np.asarray(self.token_trigrams[:, columns].sum(axis=1)).ravel()
+        candidates = np.flatnonzero(hits == len(grams))
+        return candidates[np.char.find(self.tokens[candidates], keyword) >= 0]
+
+    def matching_rows(self, keyword: str, start: int, stop: int) -> np.ndarray:
+        """Sorted ids of rows in [start, stop) whose text contains the keyword"""
+        indptr, indices = self.postings.indptr, self.postings.indices
+        parts = []
+        for token in self.matching_tokens(keyword):
+            posting = indices[indptr[token]:indptr[token + 1]]
+            lo, hi = np.searchsorted(posting, [start, stop])
+            parts.append(posting[lo:hi])
+        if not parts:
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def save(self, path: str):
+        """Write the index to a directory in memory-mappable form"""
+        save_arrays(path, tokens=self.tokens, trigrams=self.trigrams)
+        save_sparse(path, 'postings', self.postings)
+        save_sparse(path, 'token_trigrams', self.token_trigrams)
 
-def get_keyword_price_analysis(df: pd.DataFrame, brand: str, keywords: list[str]) -> dict:
+    @classmethod
+    def load(cls, path: str) -> "TokenIndex":
+        """Map an index written by save"""
+        return cls(
+            tokens=load_array(path, 'tokens'),
+            postings=load_sparse(path, 'postings', format='csc'),
+            trigrams=load_array(path, 'trigrams'),
+            token_trigrams=load_sparse(path, 'token_trigrams', format='csc')
+        )
+
+def build_token_index(df: pd.DataFrame) -> TokenIndex:
+    """Build the inverted token index and its trigram lookup at load time"""
+    tokenizer = CountVectorizer(
+        tokenizer=str.split,
+        token_pattern=None,
+        lowercase=False,
+        binary=True,
+        dtype=np.uint8
+    )
+    try:
+        postings = tokenizer.fit_transform(combined_text(df)).tocsc()
+        tokens = tokenizer.get_feature_names_out().astype(str)
+    except ValueError:
+        # Nothing to index
+        postings = sparse.csc_matrix((len(df), 0), dtype=np.uint8)
+        tokens = np.array([], dtype=str)
+    postings.sort_indices()
+
+    grammer = CountVectorizer(
+        analyzer='char',
+        ngram_range=(3, 3),
+        lowercase=False,
+        binary=True,
+        dtype=np.uint8
+    )
+    try:
+        token_trigrams = grammer.fit_transform(tokens).tocsc()
+        trigrams = grammer.get_feature_names_out().astype(str)
+    except ValueError:
+        # No token is three characters long
+        token_trigrams = sparse.csc_matrix((len(tokens), 0), dtype=np.uint8)
+        trigrams = np.array([], dtype=str)
+
+    return TokenIndex(tokens, postings, trigrams, token_trigrams)
+
+def get_keyword_price_analysis(
+    df: pd.DataFrame, token_index: TokenIndex, brand: str, keywords: list[str]
+) -> dict:
     """Analyze prices for items containing specific keywords across all relevant columns"""
     brand = unquote(brand)
     keywords = [k.lower() for k in keywords]
     
     # Filter for brand
-    brand_items = df[df['Brand'].str.lower() == brand.lower()]
+    brand_items = get_brand_items(df, brand)
     
     if brand_items.empty:
         return None
     
-    # Combine all relevant columns for searching
-    brand_items['combined_text'] = (
-        brand_items['Title'].fillna('') + ' ' + 
-        brand_items['Categories'].fillna('') + ' ' + 
-        brand_items['Colors'].fillna('') + ' ' + 
-        brand_items['Materials'].fillna('') + ' ' + 
-        brand_items['Styles'].fillna('')
-    ).str.lower()
+    start, stop = get_row_range(brand_items)
+    rows = None
+    phrases = []
     
-    # Filter for keywords in combined text
-    mask = brand_items['combined_text'].apply(
-        lambda x: all(k in x for k in keywords) if isinstance(x, str) else False
-    )
-    matching_items = brand_items[mask]
+    # Intersect the posting lists of all keywords, longest (usually rarest) first
+    for keyword in sorted(keywords, key=len, reverse=True):
+        words = keyword.split()
+        if not words:
+            # An empty keyword is contained in every text
+            continue
+        if words != [keyword]:
+            # Spans several tokens, verified against the text below
+            phrases.append(keyword)
+        for word in words:
+            matches = token_index.matching_rows(word, start, stop)
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+            if len(rows) == 0:
+                return None
+    
+    if rows is None:
+        rows = np.arange(start, stop)
+    
+    if phrases:
+        text = combined_text(df.iloc[rows])
+        mask = text.apply(lambda x: all(k in x for k in phrases)).to_numpy()
+        rows = rows[mask]
+    
+    matching_items = df.iloc[rows, [df.columns.get_loc('Price')]]
     
     if matching_items.empty:
         return None
     
     return {
-        "average_price": round(matching_items['Price'].mean(), 2),
+        "average_price": round(get_prices(matching_items).mean(), 2),
         "count": len(matching_items),
-        "min_price": round(matching_items['Price'].min(), 2),
-        "max_price": round(matching_items['Price'].max(), 2)
-    } 
\ No newline at end of file
+        "min_price": round(float(matching_items['Price'].min()), 2),
+        "max_price": round(float(matching_items['Price'].max()), 2)
+    } 
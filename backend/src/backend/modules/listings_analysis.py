@@ -1,12 +1,10 @@
-from datetime import datetime
-from typing import Literal, Optional
-import pandas as pd
+from typing import Optional
 from urllib.parse import unquote
 
-TimeUnit = Literal["weekly", "monthly", "yearly"]
+from src.backend.modules.time_rollup import TimeRollup, TimeUnit
 
 def get_listings_by_timeframe(
-    df: pd.DataFrame,
+    rollup: TimeRollup,
     brand: str,
     time_unit: TimeUnit,
     start_date: Optional[str] = None,
@@ -18,38 +16,11 @@ def get_listings_by_timeframe(
     """
     brand = unquote(brand)
     
-    # Filter for brand
-    brand_items = df[df['Brand'].str.lower() == brand.lower()]
-    
-    if brand_items.empty:
-        return []
-    
-    # Convert Item_Date to datetime
-    brand_items['Item_Date'] = pd.to_datetime(brand_items['Item_Date'])
-    
-    # Apply date filters if provided
-    if start_date:
-        start = pd.to_datetime(start_date)
-        brand_items = brand_items[brand_items['Item_Date'] >= start]
-    if end_date:
-        end = pd.to_datetime(end_date)
-        brand_items = brand_items[brand_items['Item_Date'] <= end]
-    
-    # Group by time unit
-    if time_unit == "weekly":
-        grouped = brand_items.groupby(pd.Grouper(key='Item_Date', freq='W'))
-    elif time_unit == "monthly":
-        grouped = brand_items.groupby(pd.Grouper(key='Item_Date', freq='M'))
-    else:  # yearly
-        grouped = brand_items.groupby(pd.Grouper(key='Item_Date', freq='Y'))
+    # Sum the pre-aggregated daily cells into time buckets
+    buckets = rollup.aggregate(brand, time_unit, start_date, end_date)
     
     # Format results
-    result = []
-    for date, group in grouped:
-        if not group.empty:
-            result.append({
-                "date": date.strftime("%Y-%m-%d"),
-                "count": len(group)
-            })
-    
-    return result
\ No newline at end of file
+    return [
+        {"date": date.strftime("%Y-%m-%d"), "count": int(count)}
+        for date, count in zip(buckets["date"], buckets["count"])
+    ]
@@ -1,13 +1,11 @@
-from datetime import datetime
-from typing import Literal, Optional
-import pandas as pd
+from typing import Optional
 from urllib.parse import unquote
 
-TimeUnit = Literal["weekly", "monthly", "yearly"]
+from src.backend.modules.time_rollup import TimeRollup, TimeUnit
 
 
 def calculate_average_price(
-    df: pd.DataFrame,
+    rollup: TimeRollup,
     brand: str,
     time_unit: TimeUnit,
     start_date: Optional[str] = None,
@@ -21,40 +19,48 @@ def calculate_average_price(
     # Clean brand name from URL encoding
     brand = unquote(brand)
 
-    # Filter for brand
-    brand_items = df[df["Brand"].str.lower() == brand.lower()]
+    # Sum the pre-aggregated daily cells into time buckets
+    buckets = rollup.aggregate(brand, time_unit, start_date, end_date)
 
-    if brand_items.empty:
-        return []
+    # Buckets without any priced listing have no average
+    buckets = buckets[buckets["price_count"] > 0]
+    averages = buckets["price_sum"] / buckets["price_count"] / 100
 
-    # Convert Item_Date to datetime
-    brand_items["Item_Date"] = pd.to_datetime(brand_items["Item_Date"])
+    # Format results
+    return [
+        {"date": date.strftime("%Y-%m-%d"), "price": round(float(price), 2)}
+        for date, price in zip(buckets["date"], averages)
+    ]
 
-    # Apply date filters if provided
-    if start_date:
-        start = pd.to_datetime(start_date)
-        brand_items = brand_items[brand_items["Item_Date"] >= start]
-    if end_date:
-        end = pd.to_datetime(end_date)
-        brand_items = brand_items[brand_items["Item_Date"] <= end]
 
-    # Group by time unit
-    if time_unit == "weekly":
-        grouped = brand_items.groupby(pd.Grouper(key="Item_Date", freq="W"))
-    elif time_unit == "monthly":
-        grouped = brand_items.groupby(pd.Grouper(key="Item_Date", freq="M"))
-    else:  # yearly
-        grouped = brand_items.groupby(pd.Grouper(key="Item_Date", freq="Y"))
+DISTRIBUTION_PERCENTILES = [10, 50, 90]
 
-    # Format results
-    result = []
-    for date, group in grouped:
-        if not group.empty:
-            result.append(
-                {
-                    "date": date.strftime("%Y-%m-%d"),
-                    "price": round(group["Price"].mean(), 2),
-                }
-            )
-
-    return result
+
+def get_price_distribution(
+    rollup: TimeRollup,
+    brand: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    buckets: int = 10,
+) -> Optional[dict]:
+    """
+    Price percentiles and a histogram for a brand within a date range,
+    read from the merged daily price sketches instead of the listings.
+    Percentiles are within 1% of the exact value.
+    Returns None if no listing in the range has a price.
+    """
+    brand = unquote(brand)
+
+    sketch = rollup.price_sketch(brand, start_date, end_date)
+    if sketch is None:
+        return None
+
+    percentiles = sketch.quantiles([p / 100 for p in DISTRIBUTION_PERCENTILES])
+    return {
+        "count": sketch.count,
+        "percentiles": {
+            f"p{p}": round(float(value), 2)
+            for p, value in zip(DISTRIBUTION_PERCENTILES, percentiles)
+        },
+        "histogram": sketch.histogram(buckets),
+    }
@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# Quantiles read from a sketch are within 1% of the true price
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# Prices below one cent share bin 0, prices up to MAX_PRICE get their own
+# bins and anything above falls into the last one
+MIN_PRICE = 0.01
+MAX_PRICE = 1_000_000.0
+
+_LOG_GAMMA = np.log(GAMMA)
+_FIRST_KEY = int(np.ceil(np.log(MIN_PRICE) / _LOG_GAMMA))
+NUM_BINS = int(np.ceil(np.log(MAX_PRICE) / _LOG_GAMMA)) - _FIRST_KEY + 2
+
+
+def price_bins(prices: np.ndarray) -> np.ndarray:
+    """
+    Map prices to logarithmic sketch bins, like DDSketch: bin k holds the
+    prices in (GAMMA^(k-1), GAMMA^k], so its midpoint is within
+    RELATIVE_ACCURACY of every price in it.
+    """
+    clipped = np.clip(prices, MIN_PRICE, MAX_PRICE)
+    keys = np.ceil(np.log(clipped) / _LOG_GAMMA).astype(np.int64) - _FIRST_KEY + 1
+    keys[prices < MIN_PRICE] = 0
+    return keys.astype(np.int16)
+
+
+def bin_values(bins: np.ndarray) -> np.ndarray:
+    """The price each bin stands for."""
+    keys = bins.astype(np.float64) + _FIRST_KEY - 1
+    values = 2 * GAMMA**keys / (GAMMA + 1)
+    return np.where(bins == 0, 0.0, values)
+
+
+@dataclass
+class PriceSketch:
+    """
+    Price distribution as counts per logarithmic bin. Sketches merge
+    exactly by adding their counts, so the sketch of any window is the sum
+    of its per-day sketches.
+    """
+
+    counts: np.ndarray
+
+    @classmethod
+    def merge(cls, bins: np.ndarray, counts: np.ndarray) -> "PriceSketch":
+        """Add up sparse (bin, count) pairs of any number of sketches."""
+        return cls(np.bincount(bins, weights=counts, minlength=NUM_BINS).astype(np.int64))
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def quantiles(self, qs: list[float]) -> np.ndarray:
+        """Prices at the given quantiles (0 to 1), using the lower rank."""
+        cumulative = np.cumsum(self.counts)
+        ranks = np.floor(np.asarray(qs) * (cumulative[-1] - 1))
+        return bin_values(np.searchsorted(cumulative, ranks, side="right"))
+
+    def histogram(self, buckets: int) -> list[dict]:
+        """
+        Spread the counts over equal-width price ranges between the lowest
+        and highest bin in use.
+        """
+        used = np.flatnonzero(self.counts)
+        values = bin_values(used)
+        low, high = values[0], values[-1]
+        edges = np.linspace(low, high, buckets + 1)
+        # The highest value belongs to the last range, not a new one
+        positions = np.minimum(np.searchsorted(edges, values, side="right") - 1, buckets - 1)
+        totals = np.bincount(positions, weights=self.counts[used], minlength=buckets)
+        return [
+            {
+                "min_price": round(float(edges[i]), 2),
+                "max_price": round(float(edges[i + 1]), 2),
+                "count": int(totals[i]),
+            }
+            for i in range(buckets)
+        ]
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+
+
+def render_json(payload: Any) -> bytes:
+    """Serialize a payload exactly like FastAPI's default JSONResponse."""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized JSON responses, bounded by the total size of
+    the cached bodies. Keys should include the dataset version, so entries
+    of an older dataset are never served and simply age out.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, payload: Any) -> CachedResponse:
+        body = render_json(payload)
+        entry = CachedResponse(
+            body=body, etag=f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        )
+        if len(body) > self.max_bytes:
+            # Larger than the whole budget, serve it uncached
+            return entry
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self._entries[key] = entry
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    async def respond(
+        self,
+        request: Request,
+        key: Hashable,
+        compute: Callable[[], Any],
+        run: Callable[[Callable[[], Any]], Awaitable[Any]] | None = None,
+    ) -> Response:
+        """
+        Serve the cached body for key, computing and caching it on a miss.
+        A miss is handed to run (e.g. WorkPool.run) if given, so computing
+        and serializing happen off the event loop.
+        Answers 304 when the client already holds the same body (ETag).
+        Exceptions from compute, e.g. a 404, propagate and are not cached.
+        """
+        entry = self.get(key)
+        if entry is None:
+            fill = lambda: self.put(key, compute())
+            entry = await run(fill) if run is not None else fill()
+
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header, which may list several (weak) tags."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from src.backend.modules.array_store import file_lock, load_frame, save_frame
+from src.backend.modules.data_loader import CACHE_DIR, dataset_fingerprint, load_data
+from src.backend.modules.keyword_analysis import (
+    KeywordIndex,
+    TokenIndex,
+    build_keyword_index,
+    build_token_index,
+)
+from src.backend.modules.time_rollup import TimeRollup, build_time_rollup
+
+# Snapshots of the loaded frame and its indexes, one directory per fingerprint
+SHARED_DIR = os.path.join(CACHE_DIR, "shared")
+
+# Bump whenever the snapshot layout or anything stored in it changes
+SNAPSHOT_VERSION = 2
+
+
+def load_shared_dataset() -> tuple[pd.DataFrame, TimeRollup, KeywordIndex, TokenIndex]:
+    """
+    Load the dataset and its indexes from a memory-mapped snapshot on disk.
+    The first worker to start writes the snapshot, the others wait on a
+    file lock and then map the same files, so the page cache holds one
+    copy of the data however many uvicorn workers are running.
+    """
+    fingerprint = dataset_fingerprint()
+    path = os.path.join(SHARED_DIR, fingerprint)
+
+    with file_lock(os.path.join(SHARED_DIR, ".lock")):
+        if not is_complete(path):
+            write_snapshot(path)
+            prune_snapshots(keep=fingerprint)
+
+    print(f"Mapping shared dataset from {path}")
+    return (
+        load_frame(os.path.join(path, "frame")),
+        TimeRollup.load(os.path.join(path, "rollup")),
+        KeywordIndex.load(os.path.join(path, "keywords")),
+        TokenIndex.load(os.path.join(path, "tokens")),
+    )
+
+
+def is_complete(path: str) -> bool:
+    """Whether a snapshot was fully written with the current layout."""
+    try:
+        with open(os.path.join(path, "snapshot.json")) as f:
+            return json.load(f).get("version") == SNAPSHOT_VERSION
+    except (OSError, ValueError):
+        return False
+
+
+def write_snapshot(path: str):
+    """Load the dataset, build its indexes and write them all to path."""
+    print(f"Writing shared dataset snapshot to {path}")
+    # Leftovers of an interrupted or outdated write
+    shutil.rmtree(path, ignore_errors=True)
+
+    df = load_data()
+    save_frame(os.path.join(path, "frame"), df)
+    build_time_rollup(df).save(os.path.join(path, "rollup"))
+    build_keyword_index(df).save(os.path.join(path, "keywords"))
+    build_token_index(df).save(os.path.join(path, "tokens"))
+
+    # Written last so a partial snapshot is never mapped
+    with open(os.path.join(path, "snapshot.json"), "w") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "rows": len(df)}, f)
+
+
+def prune_snapshots(keep: str):
+    """
+    Remove the snapshots of older dataset versions. Workers that still map
+    them keep working, the files are only freed once they are unmapped.
+    """
+    for name in os.listdir(SHARED_DIR):
+        path = os.path.join(SHARED_DIR, name)
+        if name != keep and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,199 @@
+import dataclasses
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import pandas as pd
+
+from src.backend.modules.ai_price_analysis import ListingPriceAnalyzer, prune_indexes
+from src.backend.modules.brand_stats import BrandStats, build_brand_stats
+from src.backend.modules.data_loader import (
+    CACHE_DIR,
+    dataset_fingerprint,
+    get_file_states,
+    get_pending_sources,
+    has_store,
+    load_data,
+    load_delta,
+)
+from src.backend.modules.dataset_store import ingest_dataset
+from src.backend.modules.keyword_analysis import (
+    KeywordIndex,
+    TokenIndex,
+    build_keyword_index,
+    build_token_index,
+)
+from src.backend.modules.shared_dataset import load_shared_dataset
+from src.backend.modules.time_rollup import TimeRollup, build_time_rollup, merge_rollups
+
+# Where the similarity index is saved between restarts
+SIMILARITY_DIR = os.path.join(CACHE_DIR, "similarity")
+
+
+@dataclass(frozen=True)
+class DatasetSnapshot:
+    """
+    One loaded version of the dataset with everything derived from it.
+    Snapshots are never modified; a reload builds a new one and swaps it
+    in, so a request that grabbed a snapshot sees one consistent version.
+    """
+
+    version: str
+    files: dict[str, tuple[int, int]]
+    df: pd.DataFrame
+    rollup: TimeRollup
+    keyword_index: KeywordIndex
+    token_index: TokenIndex
+    brand_stats: BrandStats
+    # Fitted in the background, None until ready
+    analyzer: Optional[ListingPriceAnalyzer] = None
+
+
+def build_snapshot(
+    df: pd.DataFrame,
+    files: dict[str, tuple[int, int]],
+    rollup: Optional[TimeRollup] = None,
+) -> DatasetSnapshot:
+    """
+    Build the derived indexes of a loaded frame. A rollup already brought
+    up to date, e.g. by merge_rollups, is used instead of rebuilding it.
+    """
+    return DatasetSnapshot(
+        version=dataset_fingerprint(list(files)),
+        files=files,
+        df=df,
+        # Per (brand, day) aggregates behind the time series endpoints
+        rollup=rollup if rollup is not None else build_time_rollup(df),
+        # Keyword counts per listing and per brand
+        keyword_index=build_keyword_index(df),
+        # Inverted index for keyword price queries
+        token_index=build_token_index(df),
+        # Counts, dates and mean prices per brand for /api/brands
+        brand_stats=build_brand_stats(df),
+    )
+
+
+def load_snapshot(shared: bool = False) -> DatasetSnapshot:
+    """
+    Load the whole dataset. With shared=True the frame and indexes are
+    mapped from the snapshot on disk that all workers share.
+    """
+    files = get_file_states()
+    if shared:
+        df, rollup, keyword_index, token_index = load_shared_dataset()
+        return DatasetSnapshot(
+            dataset_fingerprint(list(files)),
+            files,
+            df,
+            rollup,
+            keyword_index,
+            token_index,
+            build_brand_stats(df),
+        )
+    return build_snapshot(load_data(), files)
+
+
+def with_analyzer(snapshot: DatasetSnapshot) -> DatasetSnapshot:
+    """Return the snapshot with its similarity index loaded or fitted."""
+    analyzer = ListingPriceAnalyzer.load_or_build(snapshot.df, SIMILARITY_DIR, snapshot.version)
+    return dataclasses.replace(snapshot, analyzer=analyzer)
+
+
+class DatasetManager:
+    """
+    Holds the current snapshot and reloads it when the dataset files
+    change. Reloads run on a background thread, off the request path,
+    and replace the snapshot with a single reference assignment.
+    """
+
+    def __init__(
+        self,
+        snapshot: DatasetSnapshot,
+        shared: bool = False,
+        on_swap: Optional[Callable[[DatasetSnapshot], None]] = None,
+    ):
+        self.current = snapshot
+        self.shared = shared
+        self.on_swap = on_swap
+        self._lock = threading.Lock()
+
+    def swap(self, snapshot: DatasetSnapshot):
+        self.current = snapshot
+        print(f"Serving dataset version {snapshot.version} ({len(snapshot.df)} rows)")
+        if self.on_swap is not None:
+            self.on_swap(snapshot)
+        if snapshot.analyzer is not None:
+            # Older indexes are only removed once the new one is served
+            prune_indexes(SIMILARITY_DIR, keep=snapshot.version)
+
+    def reload(self, files: dict[str, tuple[int, int]] | None = None) -> bool:
+        """
+        Bring the snapshot up to date with the files on disk. If files were
+        only added, just those are read and appended; anything else means
+        a full reload. Returns whether a new snapshot was swapped in.
+        """
+        with self._lock:
+            snapshot = self.current
+            if files is None:
+                files = get_file_states()
+            if files == snapshot.files:
+                return False
+
+            added = [file for file in files if file not in snapshot.files]
+            unchanged = all(files.get(file) == state for file, state in snapshot.files.items())
+            if unchanged and not self.shared:
+                print(f"Loading {len(added)} new dataset files")
+                df, added_rows = load_delta(snapshot.df, added)
+                # Only the new rows are rolled up, their cells and price
+                # sketches are added to the current rollup
+                rollup = merge_rollups(snapshot.rollup, build_time_rollup(added_rows))
+                new_snapshot = build_snapshot(df, files, rollup)
+            else:
+                print("Dataset files changed, reloading everything")
+                new_snapshot = load_snapshot(self.shared)
+
+            self.swap(with_analyzer(new_snapshot))
+            return True
+
+    def watch(self, interval: float):
+        """
+        Fit the similarity index of the current snapshot, then poll the
+        dataset files every interval seconds and reload on changes. Files
+        must look the same on two polls in a row, so a CSV that is still
+        being written isn't picked up half-way. With a columnar store, new
+        crawler files are ingested into it first.
+        """
+        with self._lock:
+            if self.current.analyzer is None:
+                self.swap(with_analyzer(self.current))
+
+        if interval <= 0:
+            return
+
+        previous = self.current.files
+        previous_pending = {}
+        while True:
+            time.sleep(interval)
+            try:
+                if has_store():
+                    # Crawler files only reach a store-backed server through an ingest
+                    pending = get_file_states(get_pending_sources())
+                    if pending and pending == previous_pending:
+                        ingest_dataset()
+                        # The partitions are complete once written, reload right away
+                        self.reload()
+                    previous_pending = pending
+
+                files = get_file_states()
+                if files == previous:
+                    self.reload(files)
+                previous = files
+            except Exception as e:
+                print(f"Error reloading dataset: {str(e)}")
+
+    def start_watcher(self, interval: float) -> threading.Thread:
+        thread = threading.Thread(target=self.watch, args=(interval,), daemon=True)
+        thread.start()
+        return thread
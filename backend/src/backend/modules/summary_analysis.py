@@ -0,0 +1,82 @@
+from typing import Optional
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+from src.backend.modules.data_loader import (
+    get_brand_items,
+    get_date_range,
+    get_prices,
+    get_row_range,
+)
+from src.backend.modules.keyword_analysis import KeywordIndex
+from src.backend.modules.time_rollup import TimeRollup, TimeUnit
+
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def get_brand_summary(
+    df: pd.DataFrame,
+    rollup: TimeRollup,
+    keyword_index: KeywordIndex,
+    brand: str,
+    time_unit: TimeUnit,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    keyword_limit: int = 15,
+) -> Optional[dict]:
+    """
+    Build everything the brand dashboard needs in one go: the count and
+    average price per time bucket, price statistics with percentiles and
+    the top keywords, all for the same brand and date range.
+    Dates should be in ISO format: YYYY-MM-DD
+    Returns None if the brand has no listings in the range.
+    """
+    brand = unquote(brand)
+
+    # Count and price series share one pass over the rollup cells
+    buckets = rollup.aggregate(brand, time_unit, start_date, end_date)
+    if buckets.empty:
+        return None
+
+    series = [
+        {
+            "date": date.strftime("%Y-%m-%d"),
+            "count": int(count),
+            "price": (
+                round(float(price_sum / price_count / 100), 2) if price_count else None
+            ),
+        }
+        for date, count, price_count, price_sum in zip(
+            buckets["date"],
+            buckets["count"],
+            buckets["price_count"],
+            buckets["price_sum"],
+        )
+    ]
+
+    # Statistics and keywords come from the same brand slice
+    items = get_date_range(get_brand_items(df, brand), start_date, end_date)
+    prices = get_prices(items).dropna().to_numpy()
+
+    price_stats = None
+    if len(prices):
+        percentiles = np.percentile(prices, PERCENTILES)
+        price_stats = {
+            "average_price": round(float(prices.mean()), 2),
+            "median_price": round(float(np.median(prices)), 2),
+            "min_price": round(float(prices.min()), 2),
+            "max_price": round(float(prices.max()), 2),
+            "count": int(len(prices)),
+            "percentiles": {
+                f"p{p}": round(float(value), 2)
+                for p, value in zip(PERCENTILES, percentiles)
+            },
+        }
+
+    return {
+        "data": series,
+        "price_stats": price_stats,
+        "keywords": keyword_index.top_for_rows(*get_row_range(items), keyword_limit),
+    }
@@ -0,0 +1,311 @@
+from dataclasses import dataclass
+from typing import Literal, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.backend.modules.array_store import (
+    load_array,
+    load_index,
+    save_arrays,
+    save_index,
+)
+from src.backend.modules.data_loader import get_prices, normalize_brand
+from src.backend.modules.price_sketch import NUM_BINS, PriceSketch, price_bins
+
+TimeUnit = Literal["weekly", "monthly", "yearly"]
+
+
+@dataclass
+class TimeRollup:
+    """
+    Listing counts and price sums per (brand, day), materialized once at
+    load time. Cells are sorted by brand code and day, so a brand is the
+    range offsets[code]:offsets[code + 1] and days within it are sorted.
+    Price sums are kept in integer cents so they add up exactly in any order.
+    Each cell also has a price sketch, stored sparsely: its non-empty bins
+    are sketch_bins[sketch_offsets[cell]:sketch_offsets[cell + 1]].
+    """
+
+    brand_keys: pd.Index
+    offsets: np.ndarray
+    days: np.ndarray
+    counts: np.ndarray
+    price_counts: np.ndarray
+    price_sums: np.ndarray
+    price_sq_sums: np.ndarray
+    sketch_offsets: np.ndarray
+    sketch_bins: np.ndarray
+    sketch_counts: np.ndarray
+
+    def aggregate(
+        self,
+        brand: str,
+        time_unit: TimeUnit,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Sum the daily cells of a brand into weekly, monthly or yearly
+        buckets. Buckets are labelled like pandas' W, M and Y frequencies.
+        Returns an empty frame if the brand or window has no listings.
+        """
+        buckets = self.aggregate_brands([brand], time_unit, start_date, end_date)
+        return buckets.drop(columns="brand")
+
+    def aggregate_brands(
+        self,
+        brands: list[str],
+        time_unit: TimeUnit,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Sum the daily cells of several brands into time buckets in one
+        pass. Returns a row per (brand, bucket) with listings, sorted by
+        brand and date, where brand is the position in brands.
+        """
+        ranges = [self._day_range(brand, start_date, end_date) for brand in brands]
+        lengths = np.array([max(stop - start, 0) for start, stop in ranges], dtype=np.int64)
+        if lengths.sum() == 0:
+            return pd.DataFrame(
+                columns=["brand", "date", "count", "price_count", "price_sum", "price_sq_sum"]
+            )
+
+        cells = np.concatenate(
+            [np.arange(start, stop) for start, stop in ranges if stop > start]
+        )
+        positions = np.repeat(np.arange(len(brands)), lengths)
+        labels = bucket_labels(self.days[cells], time_unit)
+
+        # Labels are sorted within a brand, so each (brand, bucket) is a
+        # run of consecutive cells
+        changes = (positions[1:] != positions[:-1]) | (labels[1:] != labels[:-1])
+        firsts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+        return pd.DataFrame(
+            {
+                "brand": positions[firsts],
+                "date": labels[firsts],
+                "count": np.add.reduceat(self.counts[cells], firsts),
+                "price_count": np.add.reduceat(self.price_counts[cells], firsts),
+                "price_sum": np.add.reduceat(self.price_sums[cells], firsts),
+                "price_sq_sum": np.add.reduceat(self.price_sq_sums[cells], firsts),
+            }
+        )
+
+    def price_sketch(
+        self,
+        brand: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Optional[PriceSketch]:
+        """
+        Merge the daily price sketches of a brand within a date range.
+        Returns None if no listing in the range has a price.
+        """
+        start, stop = self._day_range(brand, start_date, end_date)
+        # The cells of a range own one contiguous run of sketch entries
+        first, last = self.sketch_offsets[start], self.sketch_offsets[stop]
+        if first >= last:
+            return None
+        return PriceSketch.merge(self.sketch_bins[first:last], self.sketch_counts[first:last])
+
+    def save(self, path: str):
+        """Write the rollup arrays to a directory in memory-mappable form."""
+        save_arrays(
+            path,
+            offsets=self.offsets,
+            days=self.days,
+            counts=self.counts,
+            price_counts=self.price_counts,
+            price_sums=self.price_sums,
+            price_sq_sums=self.price_sq_sums,
+            sketch_offsets=self.sketch_offsets,
+            sketch_bins=self.sketch_bins,
+            sketch_counts=self.sketch_counts,
+        )
+        save_index(path, "brand_keys", self.brand_keys)
+
+    @classmethod
+    def load(cls, path: str) -> "TimeRollup":
+        """Map a rollup written by save."""
+        return cls(
+            brand_keys=load_index(path, "brand_keys"),
+            offsets=load_array(path, "offsets"),
+            days=load_array(path, "days"),
+            counts=load_array(path, "counts"),
+            price_counts=load_array(path, "price_counts"),
+            price_sums=load_array(path, "price_sums"),
+            price_sq_sums=load_array(path, "price_sq_sums"),
+            sketch_offsets=load_array(path, "sketch_offsets"),
+            sketch_bins=load_array(path, "sketch_bins"),
+            sketch_counts=load_array(path, "sketch_counts"),
+        )
+
+    def _day_range(
+        self, brand: str, start_date: Optional[str], end_date: Optional[str]
+    ) -> tuple[int, int]:
+        """Find the cells of a brand within an inclusive date range."""
+        try:
+            code = self.brand_keys.get_loc(normalize_brand(brand))
+        except KeyError:
+            return 0, 0
+
+        start = self.offsets[code]
+        stop = self.offsets[code + 1]
+        days = self.days[start:stop]
+        if start_date:
+            start += np.searchsorted(days, _to_day(start_date), side="left")
+        if end_date:
+            stop = self.offsets[code] + np.searchsorted(
+                days, _to_day(end_date), side="right"
+            )
+        return int(start), int(stop)
+
+
+def _to_day(date: str) -> np.datetime64:
+    return pd.Timestamp(date).to_datetime64().astype("datetime64[D]")
+
+
+def bucket_labels(days: np.ndarray, time_unit: TimeUnit) -> np.ndarray:
+    """
+    Map days to the last day of their week (ending Sunday), month or year,
+    matching the labels of pd.Grouper with freq W, M and Y.
+    """
+    if time_unit == "weekly":
+        day_numbers = days.astype("int64")
+        # 1970-01-01 was a Thursday, so Monday is (n + 3) % 7 == 0
+        return days + (6 - (day_numbers + 3) % 7).astype("timedelta64[D]")
+    elif time_unit == "monthly":
+        return (days.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+    else:  # yearly
+        return (days.astype("datetime64[Y]") + 1).astype("datetime64[D]") - 1
+
+
+def build_time_rollup(df: pd.DataFrame) -> TimeRollup:
+    """
+    Collapse the listings into one cell per (brand, day) with the listing
+    count, the number of priced listings, the sum (in cents) and sum of
+    squares of their prices and a sketch of their distribution.
+    Expects the brand/date ordering from load_data.
+    """
+    if df.empty:
+        return _empty_rollup(pd.Index([]))
+
+    # Rows without a brand or date never show up in a time series
+    codes = df["Brand_Key"].cat.codes.to_numpy()
+    dated = (codes >= 0) & df["Item_Date"].notna().to_numpy()
+    codes = codes[dated]
+    brand_keys = df["Brand_Key"].cat.categories
+    if len(codes) == 0:
+        return _empty_rollup(brand_keys)
+
+    days = df["Item_Date"].to_numpy()[dated].astype("datetime64[D]")
+    prices = get_prices(df).to_numpy()[dated]
+    priced = ~np.isnan(prices)
+    prices = np.where(priced, prices, 0.0)
+    cents = np.rint(prices * 100).astype(np.int64)
+
+    # Rows are sorted by (brand, date), so each cell is a consecutive run
+    changes = (codes[1:] != codes[:-1]) | (days[1:] != days[:-1])
+    firsts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+    cell_codes = codes[firsts]
+
+    # Count the priced rows per (cell, bin); unique sorts by cell, then bin
+    cells = np.concatenate(([0], np.cumsum(changes)))
+    keys = cells[priced] * NUM_BINS + price_bins(prices[priced])
+    sketch_keys, sketch_counts = np.unique(keys, return_counts=True)
+
+    return TimeRollup(
+        brand_keys=brand_keys,
+        offsets=np.searchsorted(cell_codes, np.arange(len(brand_keys) + 1)),
+        days=days[firsts],
+        counts=np.diff(np.append(firsts, len(codes))),
+        price_counts=np.add.reduceat(priced.astype(np.int64), firsts),
+        price_sums=np.add.reduceat(cents, firsts),
+        price_sq_sums=np.add.reduceat(prices * prices, firsts),
+        sketch_offsets=np.searchsorted(
+            sketch_keys // NUM_BINS, np.arange(len(firsts) + 1)
+        ),
+        sketch_bins=(sketch_keys % NUM_BINS).astype(np.int16),
+        sketch_counts=sketch_counts,
+    )
+
+
+def merge_rollups(rollup: TimeRollup, delta: TimeRollup) -> TimeRollup:
+    """
+    Add the cells of delta, a rollup of newly loaded rows, to rollup.
+    Cells of the same (brand, day) add up their counts, sums and sketch
+    bins, so the result matches a rollup built from all rows without
+    going over the old rows again.
+    """
+    parts = [rollup, delta]
+    brand_keys = rollup.brand_keys.union(delta.brand_keys)
+
+    # Brand code of every cell in the merged brand keys
+    codes = np.concatenate(
+        [
+            brand_keys.get_indexer(part.brand_keys)[
+                np.repeat(np.arange(len(part.brand_keys)), np.diff(part.offsets))
+            ]
+            for part in parts
+        ]
+    )
+    days = np.concatenate([part.days for part in parts])
+    if len(codes) == 0:
+        return _empty_rollup(brand_keys)
+
+    order = np.lexsort((days.astype("int64"), codes))
+    codes, days = codes[order], days[order]
+    changes = (codes[1:] != codes[:-1]) | (days[1:] != days[:-1])
+    firsts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+    # Merged cell of each input cell, in input order
+    cells = np.empty(len(order), dtype=np.int64)
+    cells[order] = np.concatenate(([0], np.cumsum(changes)))
+
+    def summed(name: str) -> np.ndarray:
+        values = np.concatenate([getattr(part, name) for part in parts])
+        return np.add.reduceat(values[order], firsts)
+
+    # Sketch entries move to their merged cell; the same bin adds up
+    entry_cells = np.concatenate(
+        [
+            np.repeat(np.arange(len(part.days)), np.diff(part.sketch_offsets)) + shift
+            for part, shift in zip(parts, [0, len(rollup.days)])
+        ]
+    )
+    bins = np.concatenate([part.sketch_bins for part in parts]).astype(np.int64)
+    keys = cells[entry_cells] * NUM_BINS + bins
+    sketch_keys, entries = np.unique(keys, return_inverse=True)
+    weights = np.concatenate([part.sketch_counts for part in parts])
+    sketch_counts = np.bincount(entries, weights=weights, minlength=len(sketch_keys))
+
+    return TimeRollup(
+        brand_keys=brand_keys,
+        offsets=np.searchsorted(codes[firsts], np.arange(len(brand_keys) + 1)),
+        days=days[firsts],
+        counts=summed("counts"),
+        price_counts=summed("price_counts"),
+        price_sums=summed("price_sums"),
+        price_sq_sums=summed("price_sq_sums"),
+        sketch_offsets=np.searchsorted(
+            sketch_keys // NUM_BINS, np.arange(len(firsts) + 1)
+        ),
+        sketch_bins=(sketch_keys % NUM_BINS).astype(np.int16),
+        sketch_counts=sketch_counts.astype(np.int64),
+    )
+
+
+def _empty_rollup(brand_keys: pd.Index) -> TimeRollup:
+    return TimeRollup(
+        brand_keys=brand_keys,
+        offsets=np.zeros(len(brand_keys) + 1, dtype=np.int64),
+        days=np.array([], dtype="datetime64[D]"),
+        counts=np.array([], dtype=np.int64),
+        price_counts=np.array([], dtype=np.int64),
+        price_sums=np.array([], dtype=np.int64),
+        price_sq_sums=np.array([], dtype=np.float64),
+        sketch_offsets=np.zeros(1, dtype=np.int64),
+        sketch_bins=np.array([], dtype=np.int16),
+        sketch_counts=np.array([], dtype=np.int64),
+    )
@@ -0,0 +1,63 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import HTTPException
+
+class WorkPool:
+    """
+    Runs blocking computations of one kind of endpoint on its own threads,
+    so they never stall the event loop and one kind can't take the threads
+    of another. At most max_concurrency run at once and max_queue more may wait; beyond that requests get a
+    429. A request that takes longer than timeout seconds, waiting
+    included, gets a 504.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.pending = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # One thread per concurrent computation, so work never queues in the
+        # executor. numpy, pandas and scipy release the GIL in their inner
+        # loops, and unlike processes the threads use the loaded dataset
+        # without copying it
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix=f"{name} pool"
+        )
+
+    async def run(self, func: Callable[[], Any]) -> Any:
+        if self.pending >= self.max_concurrency + self.max_queue:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many {self.name} requests, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        started = False
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self._semaphore.acquire()
+                future = asyncio.get_running_loop().run_in_executor(self._executor, func)
+                # A thread can't be stopped, so its slot is only freed once
+                # it finishes, even if the request timed out before
+                future.add_done_callback(self._release)
+                started = True
+                return await asyncio.shield(future)
+        except TimeoutError:
+            raise HTTPException(
+                status_code=504, detail=f"The {self.name} request took too long"
+            )
+        finally:
+            if not started:
+                self.pending -= 1
+
+    def _release(self, future: asyncio.Future):
+        self._semaphore.release()
+        self.pending -= 1
+        # Read the exception of abandoned futures so it isn't logged as lost
+        if not future.cancelled():
+            future.exception()
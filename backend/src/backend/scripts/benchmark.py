@@ -0,0 +1,333 @@
+"""
+Benchmark the analytics on a generated dataset shaped like the crawler
+output. Run from the backend folder:
+
+    python -m src.backend.scripts.benchmark --rows 1000000 --output bench.json
+
+The dataset is written to --data-dir (reused if it was generated with the
+same settings) and the server modules are pointed at it, so the real data
+in backend/dataset is never touched. Timings, latency percentiles,
+throughput and the process peak memory after each phase are written as
+JSON, to compare between commits.
+"""
+import argparse
+import dataclasses
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Real brand names lead the Zipf distribution, generated names fill the tail
+BRANDS = [
+    "Sonstiges", "H&M", "Zara", "Nike", "adidas", "C&A", "Shein", "ONLY",
+    "Topomini", "Stradivarius", "Esprit", "Bershka", "Topolino", "Ralph Lauren",
+    "s.Oliver", "Primark", "Tommy Hilfiger", "Levi's", "Vero Moda", "Mango",
+    "Pull & Bear", "New Look", "Puma", "Tom Tailor", "Jack & Jones", "Hollister",
+    "Abercrombie & Fitch", "Only & Sons", "Lacoste", "The North Face",
+]
+WORDS = [
+    "jeans", "hoodie", "jacke", "kleid", "sneaker", "shirt", "pullover", "rock",
+    "hose", "bluse", "mantel", "top", "schuhe", "stiefel", "tasche", "weste",
+    "strickjacke", "cardigan", "blazer", "shorts", "vintage", "neu", "oversize",
+    "schwarz", "blau", "weiß", "rot", "grün", "beige", "grau", "y2k", "basic",
+    "damen", "herren", "kinder", "baumwolle", "leder", "denim", "sommer", "winter",
+]
+SIZES = ["XS", "S", "M", "L", "XL", "34", "36", "38", "40", "42", "110", "128"]
+CATEGORIES = ["Tops", "Bottoms", "Shoes", "Dresses", "Outerwear", "Accessories"]
+COLORS = ["Black", "White", "Blue", "Red", "Green", "Beige", "Grey", "Pink"]
+MATERIALS = ["Cotton", "Denim", "Leather", "Polyester", "Wool", "Linen"]
+STYLES = ["Casual", "Sporty", "Formal", "Vintage", "Streetwear", "Elegant"]
+
+# Share of rows that repeat a listing on another day, like reposts
+REPEAT_SHARE = 0.15
+# Share of rows with classification labels
+CLASSIFIED_SHARE = 0.3
+LAST_DAY = np.datetime64("2024-10-31")
+DAYS = 365
+
+
+def brand_names(count: int) -> np.ndarray:
+    generated = [f"Brand {i}" for i in range(max(0, count - len(BRANDS)))]
+    return np.array((BRANDS + generated)[:count], dtype=object)
+
+
+def pick_words(rng, vocabulary: list[str], rows: int, words: int) -> pd.Series:
+    """Space separated random words, one string per row."""
+    picks = np.array(vocabulary, dtype=object)[rng.integers(0, len(vocabulary), (rows, words))]
+    text = pd.Series(picks[:, 0])
+    for column in range(1, words):
+        text = text + " " + picks[:, column]
+    return text
+
+
+def generate_rows(rng, first_id: int, rows: int, brands: np.ndarray, brand_prices: np.ndarray) -> pd.DataFrame:
+    """One file worth of listings in the crawler's column layout."""
+    # Zipf-like popularity, a few brands hold most of the listings
+    weights = 1 / np.arange(1, len(brands) + 1) ** 1.1
+    brand_codes = rng.choice(len(brands), rows, p=weights / weights.sum())
+
+    ids = np.arange(first_id, first_id + rows, dtype=np.int64)
+    # Reposts reuse the ID and brand of an earlier row on another day
+    repeats = np.flatnonzero(rng.random(rows) < REPEAT_SHARE)
+    repeats = repeats[repeats > 0]
+    sources = (rng.random(len(repeats)) * repeats).astype(np.int64)
+    ids[repeats] = ids[sources]
+    brand_codes[repeats] = brand_codes[sources]
+
+    # Log-normal prices around a per-brand level, capped like the crawler's
+    # search (price_to=100) and rounded to typical asking prices
+    prices = brand_prices[brand_codes] * rng.lognormal(0, 0.7, rows)
+    prices = np.floor(np.clip(prices, 1, 99)) + rng.choice([0.0, 0.5, 0.99], rows)
+
+    days = LAST_DAY - rng.integers(0, DAYS, rows).astype("timedelta64[D]")
+    titles = pick_words(rng, WORDS, rows, 3) + " Gr " + pd.Series(
+        np.array(SIZES, dtype=object)[rng.integers(0, len(SIZES), rows)]
+    )
+
+    df = pd.DataFrame(
+        {
+            "ID": ids,
+            "Title": titles,
+            "Brand": brands[brand_codes],
+            "Price": prices.round(2),
+            "Currency": "EUR",
+            "Item_Date": pd.to_datetime(days).strftime("%Y-%m-%d"),
+            "Colors": pick_words(rng, COLORS, rows, 2),
+            "Materials": pick_words(rng, MATERIALS, rows, 1),
+            "Styles": pick_words(rng, STYLES, rows, 2),
+            "Categories": pick_words(rng, CATEGORIES, rows, 1),
+        }
+    )
+    # Only part of the dataset has been classified
+    unclassified = rng.random(rows) >= CLASSIFIED_SHARE
+    df.loc[unclassified, ["Colors", "Materials", "Styles", "Categories"]] = None
+    # Newest day first, like a crawl
+    return df.sort_values("Item_Date", ascending=False, kind="stable")
+
+
+def generate_dataset(directory: str, rows: int, rows_per_file: int, seed: int):
+    """
+    Write rows synthetic listings as CSV files of at most rows_per_file
+    rows. Settings are recorded in benchmark.json, and a directory already
+    generated with the same settings is left as it is.
+    """
+    settings = {"rows": rows, "rows_per_file": rows_per_file, "seed": seed}
+    settings_path = os.path.join(directory, "benchmark.json")
+    if os.path.exists(settings_path):
+        with open(settings_path) as f:
+            if json.load(f) == settings:
+                print(f"Reusing dataset in {directory}")
+                return
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(".csv"):
+            os.remove(os.path.join(directory, name))
+
+    rng = np.random.default_rng(seed)
+    brands = brand_names(int(np.clip(rows // 200, 100, 5000)))
+    brand_prices = rng.lognormal(np.log(10), 0.6, len(brands))
+
+    written = 0
+    part = 0
+    while written < rows:
+        count = min(rows_per_file, rows - written)
+        df = generate_rows(rng, 5_000_000_000 + written, count, brands, brand_prices)
+        path = os.path.join(directory, f"synthetic_{part:04d}.csv")
+        df.to_csv(path, index=False)
+        print(f"Wrote {count} rows to {path}")
+        written += count
+        part += 1
+
+    with open(settings_path, "w") as f:
+        json.dump(settings, f)
+
+
+def peak_rss_mb() -> float:
+    """
+    High-water mark of the process memory since it started. It never goes
+    down, so a phase only shows up if it needs more than the ones before.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def latency_stats(latencies: list[float]) -> dict:
+    """Percentiles in milliseconds and sequential throughput."""
+    values = np.array(latencies) * 1000
+    return {
+        "requests": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+        "throughput_rps": round(len(values) / (values.sum() / 1000), 1),
+    }
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def endpoint_urls(brands: list[str], keywords: list[list[str]]) -> dict[str, list[str]]:
+    """
+    URLs per endpoint, cycling through the most listed brands and the
+    keywords. Comparisons use all the given brands, and once without a
+    brand list, which covers every qualified brand.
+    """
+    quoted = [brand.replace("&", "%26") for brand in brands]
+    first_keywords = ",".join(keywords[0])
+    return {
+        "root": ["/"],
+        "brands": ["/api/brands", "/api/brands?prefix=s&min_count=1&limit=20"],
+        "pricing_average": [f"/api/{b}/monthly/pricing/average" for b in quoted[:10]],
+        "pricing_distribution": [f"/api/{b}/pricing/distribution" for b in quoted[:10]],
+        "listings_count": [f"/api/{b}/weekly/listings/count?start=2024-01-01" for b in quoted[:10]],
+        "summary": [f"/api/{b}/monthly/summary" for b in quoted[:10]],
+        "keywords_top": [f"/api/{b}/keywords/top/15" for b in quoted[:10]],
+        "keyword_analysis": [
+            f"/api/{b}/keywords/{','.join(words)}" for b in quoted[:10] for words in keywords
+        ],
+        "similar_listings": [f"/api/ai/similar-listings/{','.join(words)}" for words in keywords],
+        "compare": [
+            f"/api/compare/monthly?brands={','.join(quoted[:10])}",
+            f"/api/compare/weekly?brands={','.join(quoted)}",
+        ],
+        "leaderboard": [
+            f"/api/leaderboard/monthly?brands={','.join(quoted)}",
+            f"/api/leaderboard/weekly?brands={','.join(quoted)}&limit=5",
+        ],
+        "compare_all": ["/api/compare/monthly", "/api/compare/weekly?start=2024-06-01"],
+        "leaderboard_all": ["/api/leaderboard/monthly", "/api/leaderboard/weekly?limit=5"],
+        "cached": [f"/api/{quoted[0]}/monthly/summary", f"/api/ai/similar-listings/{first_keywords}"],
+    }
+
+
+def run_benchmark(data_dir: str, requests: int) -> dict:
+    """Time loading, every endpoint and the similarity index on data_dir."""
+    # Read by data_loader and main at import time
+    os.environ["VINTALYTICS_DATASET_DIR"] = data_dir
+    os.environ["VINTALYTICS_RELOAD_INTERVAL"] = "0"
+    from src.backend.modules.ai_price_analysis import ListingPriceAnalyzer
+    from src.backend.modules.data_loader import load_data
+
+    results = {}
+
+    df, seconds = timed(load_data)
+    results["load_data"] = {
+        "seconds": round(seconds, 3),
+        "rows": len(df),
+        "rows_per_second": round(len(df) / seconds),
+        "cumulative_peak_rss_mb": peak_rss_mb(),
+    }
+    del df
+    gc.collect()
+
+    # Importing the app loads the dataset and builds the snapshot indexes
+    def start_server():
+        from src.backend import main
+        return main
+
+    main, seconds = timed(start_server)
+    snapshot = main.datasets.current
+    results["startup"] = {"seconds": round(seconds, 3), "cumulative_peak_rss_mb": peak_rss_mb()}
+
+    analyzer = ListingPriceAnalyzer()
+    _, seconds = timed(lambda: analyzer.load_and_prepare_data(snapshot.df))
+    results["analyzer_fit"] = {"seconds": round(seconds, 3), "cumulative_peak_rss_mb": peak_rss_mb()}
+
+    rng = np.random.default_rng(0)
+    keywords = [list(rng.choice(WORDS, 2, replace=False)) for _ in range(8)]
+    latencies = [timed(lambda: analyzer.find_similar_listings(words))[1] for words in keywords * 4]
+    results["analyzer_query"] = latency_stats(latencies)
+
+    # The similarity endpoint answers 503 until the snapshot has an analyzer
+    main.datasets.swap(dataclasses.replace(snapshot, analyzer=analyzer))
+
+    from fastapi.testclient import TestClient
+
+    # Without the context manager the lifespan, and with it the reload
+    # watcher, isn't started
+    client = TestClient(main.app)
+    brands = [entry["brand"] for entry in client.get("/api/brands?limit=50").json()["brands"]]
+    results["endpoints"] = {}
+    for name, urls in endpoint_urls(brands, keywords).items():
+        latencies = []
+        statuses = set()
+        for i in range(requests):
+            url = urls[i % len(urls)]
+            # Time the computation, not the response cache, except for "cached"
+            if name != "cached":
+                main.response_cache.clear()
+            response, seconds = timed(lambda: client.get(url))
+            latencies.append(seconds)
+            statuses.add(response.status_code)
+        results["endpoints"][name] = {**latency_stats(latencies), "statuses": sorted(statuses)}
+        print(f"{name}: p50 {results['endpoints'][name]['p50_ms']} ms")
+
+    results["cumulative_peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analytics on a synthetic dataset")
+    parser.add_argument("--rows", type=int, default=100_000, help="Listings to generate")
+    parser.add_argument("--rows-per-file", type=int, default=1_000_000, help="Listings per CSV file")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed of the generator")
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join(tempfile.gettempdir(), "vintalytics-benchmark"),
+        help="Where the synthetic dataset is written",
+    )
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint")
+    parser.add_argument("--output", help="Write the results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(os.path.join(args.data_dir, f"rows_{args.rows}_seed_{args.seed}"))
+    generate_dataset(data_dir, args.rows, args.rows_per_file, args.seed)
+
+    report = {
+        "meta": {
+            "rows": args.rows,
+            "seed": args.seed,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+        },
+        **run_benchmark(data_dir, args.requests),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import sqlite3
+import threading
+from typing import Iterable, List, Set
+
+
+class CrawlState:
+    """
+    SQLite record of crawl progress, kept next to the CSV files so an
+    interrupted or overlapping crawl picks up where the last one stopped:
+    the pages already saved per day, the days fetched to their last page,
+    and the items already written. Items are keyed by ID and day like the
+    dataset itself, since a listing shows up again on every day it is
+    online.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Shared by the crawler threads, every access holds the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "day TEXT, page INTEGER, items INTEGER, PRIMARY KEY (day, page))"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS days (day TEXT PRIMARY KEY, pages INTEGER)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS items (id TEXT, day TEXT, PRIMARY KEY (id, day)) WITHOUT ROWID"
+            )
+
+    def finished_days(self) -> Set[str]:
+        """Days whose pages were all fetched"""
+        with self._lock:
+            return {day for (day,) in self._db.execute("SELECT day FROM days")}
+
+    def next_page(self, day: str) -> int:
+        """First page of a day that hasn't been saved yet"""
+        with self._lock:
+            (last,) = self._db.execute(
+                "SELECT COALESCE(MAX(page), 0) FROM pages WHERE day = ?", (day,)
+            ).fetchone()
+        return last + 1
+
+    def unseen(self, day: str, ids: Iterable) -> List[str]:
+        """The ids that weren't saved for this day yet, in their order"""
+        ids = [str(i) for i in ids]
+        with self._lock:
+            seen = set()
+            # Stay below SQLite's limit of bound parameters
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                seen.update(
+                    row[0] for row in self._db.execute(
+                        f"SELECT id FROM items WHERE day = ? AND id IN ({','.join('?' * len(chunk))})",
+                        [day, *chunk],
+                    )
+                )
+        return [i for i in ids if i not in seen]
+
+    def finish_page(self, day: str, page: int, ids: Iterable):
+        """Record a page and its new items once their rows are written"""
+        ids = [str(i) for i in ids]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO items (id, day) VALUES (?, ?)", [(i, day) for i in ids]
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (day, page, items) VALUES (?, ?, ?)",
+                (day, page, len(ids)),
+            )
+
+    def finish_day(self, day: str, pages: int):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO days (day, pages) VALUES (?, ?)", (day, pages))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
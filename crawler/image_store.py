@@ -0,0 +1,80 @@
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+MANIFEST_NAME = "manifest.tsv"
+
+
+class ImageStore:
+    """
+    Content-addressed image directory. Each distinct photo is stored once
+    under objects/<2 hex>/<2 hex>/<sha256><ext>, however many listings use
+    it, and manifest.tsv maps item IDs to their photo, one
+    "item_id<TAB>sha256<TAB>ext" line per item. The manifest is read once
+    when the store is opened, so lookups never touch the file system.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        os.makedirs(root, exist_ok=True)
+        self._items: Dict[str, Tuple[str, str]] = load_manifest(self.manifest_path)
+        self._end_manifest_line()
+        self._digests = {digest for digest, _ in self._items.values()}
+        self._lock = threading.Lock()
+
+    def _end_manifest_line(self):
+        # A crash can leave the last line unfinished, don't append to it
+        if os.path.exists(self.manifest_path) and os.path.getsize(self.manifest_path) > 0:
+            with open(self.manifest_path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def __contains__(self, item_id) -> bool:
+        return str(item_id) in self._items
+
+    def object_path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest[2:4], f"{digest}{ext}")
+
+    def path(self, item_id) -> Optional[str]:
+        """Path of an item's photo, or None if it isn't stored"""
+        entry = self._items.get(str(item_id))
+        return self.object_path(*entry) if entry else None
+
+    def add(self, item_id, content: bytes, ext: str) -> str:
+        """Store a photo for an item, writing it only if it is new. Returns its path."""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.object_path(digest, ext)
+
+        with self._lock:
+            is_new = digest not in self._digests and not os.path.exists(path)
+        if is_new:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a temporary name so a crash never leaves half an image
+            tmp_path = f"{path}.{threading.get_ident()}.part"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._digests.add(digest)
+            self._items[str(item_id)] = (digest, ext)
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(f"{item_id}\t{digest}\t{ext}\n")
+        return path
+
+
+def load_manifest(path: str) -> Dict[str, Tuple[str, str]]:
+    """Read a manifest into item_id -> (sha256, ext); later lines win"""
+    items = {}
+    if not os.path.exists(path):
+        return items
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            # Skip a line cut short by a crash
+            if len(parts) == 3 and len(parts[1]) == 64:
+                items[parts[0]] = (parts[1], parts[2])
+    return items
@@ -0,0 +1,196 @@
+import csv
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Optional
+
+# Fixed output schema: column, item attribute and type. Lists hold labels
+# such as materials; CSV files store them space separated like the
+# classifier does, Parquet files as real lists
+FIELDS = [
+    ("ID", "id", "int"),
+    ("Photo", "photo", "str"),
+    ("Title", "title", "str"),
+    ("Brand", "brand_title", "str"),
+    ("Price", "price", "float"),
+    ("URL", "url", "str"),
+    ("Currency", "currency", "str"),
+    ("Item_Date", None, "date"),
+    ("Colors", "color", "list"),
+    ("Materials", "materials", "list"),
+    ("Styles", "style", "list"),
+    ("Categories", "categories", "list"),
+]
+
+COLUMNS = [column for column, _, _ in FIELDS]
+
+
+def to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float(value) -> Optional[float]:
+    # pyVinted may return prices as strings or as {"amount": ...}
+    if isinstance(value, dict):
+        value = value.get("amount")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_str(value) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def to_list(value) -> List[str]:
+    """Labels of a field that may be missing, a single value or a list"""
+    if value is None or value == "":
+        return []
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    # Nested objects carry their name in title, e.g. a material
+    return [
+        v if isinstance(v, str) else str(getattr(v, "title", v))
+        for v in value
+        if v not in (None, "")
+    ]
+
+
+CONVERTERS = {"int": to_int, "float": to_float, "str": to_str, "list": to_list}
+
+
+def item_row(item, day: datetime) -> dict:
+    """Typed output row for one search result"""
+    row = {}
+    for column, attribute, kind in FIELDS:
+        if kind == "date":
+            row[column] = day
+        else:
+            row[column] = CONVERTERS[kind](getattr(item, attribute, None))
+    return row
+
+
+class Sink(ABC):
+    """
+    Buffers typed rows and writes them in batches of batch_size. Rows are
+    only on disk after flush(), so callers record progress after it.
+    Not thread safe, callers hold a lock.
+    """
+
+    extension = ""
+
+    def __init__(self, path: str, batch_size: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._batch = []
+
+    def add(self, rows: List[dict]) -> bool:
+        """Queue rows; returns True once a full batch is waiting to be flushed"""
+        self._batch.extend(rows)
+        return len(self._batch) >= self.batch_size
+
+    def flush(self):
+        if self._batch:
+            self._write(self._batch)
+            self.rows_written += len(self._batch)
+            self._batch = []
+
+    @abstractmethod
+    def _write(self, rows: List[dict]):
+        """Write one batch of rows to disk"""
+
+    def close(self):
+        self.flush()
+
+
+class CsvSink(Sink):
+    """CSV file in the layout the backend reads"""
+
+    extension = ".csv"
+
+    def __init__(self, path: str, batch_size: int = 10000):
+        super().__init__(path, batch_size)
+        self._file = open(path, mode="w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+        self._file.flush()
+
+    def _write(self, rows: List[dict]):
+        self._writer.writerows(
+            [
+                [
+                    " ".join(row[column]) if kind == "list"
+                    else row[column].strftime("%Y-%m-%d") if kind == "date"
+                    else row[column]
+                    for column, _, kind in FIELDS
+                ]
+                for row in rows
+            ]
+        )
+        self._file.flush()
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class ParquetSink(Sink):
+    """
+    Parquet output with a fixed Arrow schema. A Parquet file is only
+    readable once it is closed, so every batch is written as its own part
+    file, <path stem>-00000.parquet and so on, and nothing is lost to a crash
+    but the batch in memory.
+    """
+
+    extension = ".parquet"
+
+    def __init__(self, path: str, batch_size: int = 10000):
+        import pyarrow as pa
+
+        super().__init__(path, batch_size)
+        self._stem = os.path.splitext(path)[0]
+        # Shown to the user, the data is in the part files
+        self.path = f"{self._stem}-*{self.extension}"
+        self._pa = pa
+        self._parts = 0
+        types = {
+            "int": pa.int64(),
+            "float": pa.float32(),
+            "str": pa.string(),
+            "date": pa.timestamp("ns"),
+            "list": pa.list_(pa.string()),
+        }
+        self.schema = pa.schema([(column, types[kind]) for column, _, kind in FIELDS])
+
+    def part_path(self, part: int) -> str:
+        return f"{self._stem}-{part:05d}{self.extension}"
+
+    def _write(self, rows: List[dict]):
+        import pyarrow.parquet as pq
+
+        batch = self._pa.RecordBatch.from_pydict(
+            {column: [row[column] for row in rows] for column in COLUMNS}, schema=self.schema
+        )
+        path = self.part_path(self._parts)
+        # Written under a temporary name so readers never see half a file
+        pq.write_table(self._pa.Table.from_batches([batch]), f"{path}.part")
+        os.replace(f"{path}.part", path)
+        self._parts += 1
+
+
+SINKS = {"csv": CsvSink, "parquet": ParquetSink}
+
+
+def create_sink(output_format: str, path_stem: str, batch_size: int = 10000) -> Sink:
+    """Create a sink by format name, "csv" or "parquet", writing to path_stem plus extension"""
+    if output_format not in SINKS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    sink_class = SINKS[output_format]
+    return sink_class(path_stem + sink_class.extension, batch_size)
@@ -0,0 +1,99 @@
+"""
+Local stand-in for the Vinted search API, to try out the crawler without
+touching the real site:
+
+    python stub_server.py --port 8123 --latency 0.2 --fail-rate 0.1
+    python vinted_crawler.py 2024-01-01 2024-01-07 --workers 4 --rate 20 \
+        --api-url http://localhost:8123/items --data-dir /tmp/crawl
+
+Every day has a deterministic number of pages of fake items. Requests can
+be delayed and randomly answered with 429 or 500 to exercise the retries.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BRANDS = ["Nike", "Zara", "H&M", "Adidas", "Levi's", "Only"]
+WORDS = ["jeans", "hoodie", "jacke", "kleid", "sneaker", "shirt", "vintage", "schwarz", "blau"]
+
+# Settings from the command line
+options = argparse.Namespace(latency=0.0, fail_rate=0.0, pages=5)
+
+
+def fake_items(timestamp: int, page: int, per_page: int, base_url: str) -> list:
+    day = timestamp // 86400
+    # Between 1 and options.pages pages per day
+    if page > 1 + day % options.pages:
+        return []
+
+    items = []
+    for i in range(per_page):
+        item_id = day * 100000 + page * 1000 + i
+        rng = random.Random(item_id)
+        # Some listings share a photo, like reposted items
+        photo_id = item_id - item_id % 3
+        items.append({
+            "id": item_id,
+            "photo": f"{base_url}/images/{photo_id}.jpg",
+            "title": " ".join(rng.sample(WORDS, 3)),
+            "brand_title": rng.choice(BRANDS),
+            "price": f"{rng.uniform(2, 100):.2f}",
+            "url": f"{base_url}/items/{item_id}",
+            "currency": "EUR",
+        })
+    return items
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(options.latency)
+        if random.random() < options.fail_rate:
+            self.send_error(random.choice([429, 500]))
+            return
+
+        url = urlparse(self.path)
+        base_url = f"http://{self.headers['Host']}"
+        if url.path == "/items":
+            query = parse_qs(url.query)
+            items = fake_items(
+                int(query["time"][0]),
+                int(query.get("page", ["1"])[0]),
+                int(query.get("per_page", ["100"])[0]),
+                base_url,
+            )
+            self._send(json.dumps({"items": items}).encode(), "application/json")
+        elif url.path.startswith("/images/"):
+            # Same bytes for the same photo id
+            self._send(url.path.encode() * 64, "image/jpeg")
+        else:
+            self.send_error(404)
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve fake Vinted search pages and images')
+    parser.add_argument('--port', type=int, default=8123)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of requests answered with 429 or 500')
+    parser.add_argument('--pages', type=int, default=5, help='Maximum pages per day')
+    parser.parse_args(namespace=options)
+
+    server = ThreadingHTTPServer(("127.0.0.1", options.port), StubHandler)
+    print(f"Stub API on http://127.0.0.1:{options.port}/items")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
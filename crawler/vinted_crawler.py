@@ -1,177 +1,281 @@
-import csv
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-import time
-from pyVinted import Vinted
+from types import SimpleNamespace
+from typing import Optional
 import os
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
 import argparse
-import calendar
 
-vinted = Vinted()
+from crawl_state import CrawlState
+from image_store import ImageStore
+from rate_limiter import TokenBucket, with_retries
+from sinks import create_sink, item_row
 
-def download_image(url, item_id):
-    # Create images directory if it doesn't exist
-    if not os.path.exists("images"):
-        os.makedirs("images")
+SEARCH_URL = "https://www.vinted.de/vetement?order=newest_first&price_to=100&currency=EUR"
+ITEMS_PER_PAGE = 100  # Maximum items per page
+MAX_PAGES = 100  # Page limit for safety
 
-    # Get file extension from URL
-    ext = os.path.splitext(urlparse(url).path)[1] or ".jpg"
-    filepath = f"images/{item_id}{ext}"
 
-    # Skip if image already exists
-    if os.path.exists(filepath):
-        return
+class VintedSource:
+    """Search pages from Vinted through pyVinted"""
+
+    def __init__(self):
+        from pyVinted import Vinted
+        self.vinted = Vinted()
+
+    def search(self, timestamp: int, page: int):
+        return self.vinted.items.search(SEARCH_URL, ITEMS_PER_PAGE, page, time=timestamp)
+
+
+class HttpSource:
+    """Search pages from a JSON API with the same items, e.g. stub_server.py"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session = requests.Session()
+
+    def search(self, timestamp: int, page: int):
+        response = self.session.get(
+            self.url,
+            params={"time": timestamp, "page": page, "per_page": ITEMS_PER_PAGE},
+            timeout=30,
+        )
+        response.raise_for_status()
+        return [SimpleNamespace(**item) for item in response.json()["items"]]
+
+
+class ImageDownloader:
+    """
+    Downloads item photos into an ImageStore on its own thread pool
+    through one pooled HTTP session, so image transfers overlap with page
+    fetches and reuse connections.
+    """
+
+    def __init__(self, images_dir: str, workers: int = 4):
+        self.store = ImageStore(images_dir)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="images")
+
+    def submit(self, url: str, item_id):
+        # Skip if image already exists
+        if item_id in self.store:
+            return
+        self.executor.submit(self._download, url, item_id)
+
+    def _download(self, url: str, item_id):
+        try:
+            response = with_retries(lambda: self._get(url), attempts=3)
+        except Exception as e:
+            print(f"    ⚠️ Error downloading image {url}: {str(e)}")
+            return
+
+        if response.status_code == 200:
+            # Get file extension from URL
+            ext = os.path.splitext(urlparse(url).path)[1] or ".jpg"
+            self.store.add(item_id, response.content, ext)
+
+    def _get(self, url: str) -> requests.Response:
+        response = self.session.get(url, timeout=30)
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        return response
+
+    def close(self):
+        """Wait for the queued downloads to finish"""
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+
+def fetch_day(source, day: datetime, first_page: int, limiter: TokenBucket, save_page) -> Optional[int]:
+    """
+    Fetch the pages of one day from first_page on, handing each page to
+    save_page. Returns the number of pages fetched, or None if the day
+    couldn't be finished.
+    """
+    timestamp = int(day.timestamp())
+
+    # Iterate through all pages for current day
+    for page in range(first_page, MAX_PAGES + 1):
+        def fetch_page():
+            limiter.acquire()
+            return source.search(timestamp, page)
+
+        try:
+            search_result = with_retries(fetch_page)
+        except Exception as page_error:
+            print(f"    ⚠️ Error on page {page} of {day.strftime('%Y-%m-%d')}: {str(page_error)}")
+            return None
+
+        # Check if search_result is None or empty
+        if not search_result:
+            return page - 1
+
+        save_page(day, page, search_result)
 
-    # Download and save image
-    response = requests.get(url)
-    if response.status_code == 200:
-        with open(filepath, "wb") as f:
-            f.write(response.content)
+    return MAX_PAGES
+
+
+def fetch_and_save_items(
+    start_date: datetime,
+    end_date: datetime,
+    workers: int = 1,
+    rate: float = 0.5,
+    image_workers: int = 4,
+    source=None,
+    data_dir: str = "analytics/vintalytics/data",
+    state_path: Optional[str] = None,
+    output_format: str = "csv",
+    batch_size: int = 10000,
+):
+    """
+    Fetch items for a specific date range. Up to `workers` days are
+    fetched at once, while all page requests together stay within `rate`
+    requests per second. Rows are written in batches of `batch_size` as
+    CSV or Parquet. Progress is recorded in a crawl state database once
+    a batch is on disk, so days and pages finished by an earlier run are
+    skipped and items already saved for a day aren't written again.
+    """
+    if source is None:
+        source = VintedSource()
 
-def fetch_and_save_items(start_date: datetime, end_date: datetime):
-    """Fetch items for a specific date range"""
-    
     # Create filename with date range and current timestamp
     current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
+
     # Ensure analytics/data directory exists
-    data_dir = "analytics/vintalytics/data"
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
-    
-    # Format filename with start and end dates
-    filename = os.path.join(
-        data_dir, 
-        f"{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}_{current_time}.csv"
+
+    # Format filename with start and end dates, the sink adds the extension
+    path_stem = os.path.join(
+        data_dir,
+        f"{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}_{current_time}"
     )
-    
+
     print(f"\n🔍 Scraping data from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-    
-    # Create images directory if it doesn't exist
-    images_dir = os.path.join(data_dir, "images")
-    if not os.path.exists(images_dir):
-        os.makedirs(images_dir)
-    
-    # Update download_image function to use the new path
-    def download_image(url, item_id):
-        # Get file extension from URL
-        ext = os.path.splitext(urlparse(url).path)[1] or ".jpg"
-        filepath = os.path.join(images_dir, f"{item_id}{ext}")
+    print(f"⚙️ {workers} days in parallel, at most {rate} requests per second")
 
-        # Skip if image already exists
-        if os.path.exists(filepath):
-            return
+    state = CrawlState(state_path or os.path.join(data_dir, "crawl_state.sqlite"))
+    limiter = TokenBucket(rate)
+    images = ImageDownloader(os.path.join(data_dir, "images"), image_workers)
 
-        # Download and save image
-        response = requests.get(url)
-        if response.status_code == 200:
-            with open(filepath, "wb") as f:
-                f.write(response.content)
-    
-    # Open file in write mode (not append since it's a new file)
-    with open(filename, mode="w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-
-        # Updated header with new columns
-        writer.writerow([
-            "ID", "Photo", "Title", "Brand", "Price", "URL", 
-            "Currency", "Item_Date", "Colors", "Materials", 
-            "Styles", "Categories"
-        ])
-
-        current_date = end_date
-        total_items = 0
-
-        # Iterate through each day backwards
-        while current_date >= start_date:
-            try:
-                timestamp = int(current_date.timestamp())
-                page = 1
-                items_found = True
-                daily_items = 0
-
-                print(f"\n📆 Processing {current_date.strftime('%Y-%m-%d')}...")
-
-                # Iterate through all pages for current day
-                while items_found and page <= 100:  # Page limit for safety
-                    try:
-                        print(f"  📄 Fetching page {page}...", end='\r')
-
-                        # Fetch items for current day and page
-                        search_result = vinted.items.search(
-                            "https://www.vinted.de/vetement?order=newest_first&price_to=100&currency=EUR",
-                            100,  # Maximum items per page
-                            page,
-                            time=timestamp,
-                        )
-
-                        # Check if search_result is None or empty
-                        if not search_result or len(search_result) == 0:
-                            items_found = False
-                            break
-
-                        # Process items
-                        for item in search_result:
-                            try:
-                                # Download image
-                                if hasattr(item, "photo") and item.photo:
-                                    download_image(item.photo, item.id)
-
-                                # Updated row with new columns
-                                writer.writerow([
-                                    getattr(item, "id", ""),
-                                    getattr(item, "photo", ""),
-                                    getattr(item, "title", ""),
-                                    getattr(item, "brand_title", ""),
-                                    getattr(item, "price", ""),
-                                    getattr(item, "url", ""),
-                                    getattr(item, "currency", ""),
-                                    current_date.strftime("%Y-%m-%d"),
-                                    # New columns - extract from item attributes if available
-                                    getattr(item, "color", ""),  # or color_title
-                                    getattr(item, "materials", ""),  # Might be a list
-                                    getattr(item, "style", ""),  # or style_title
-                                    getattr(item, "categories", "")  # Might be a list
-                                ])
-                                daily_items += 1
-                                total_items += 1
-                            except Exception as item_error:
-                                print(f"    ⚠️ Error processing item: {str(item_error)}")
-                                continue
-
-                        page += 1
-                        time.sleep(2)  # Rate limiting
-
-                    except Exception as page_error:
-                        print(f"    ⚠️ Error on page {page}: {str(page_error)}")
-                        items_found = False
-                        break
-
-                print(f"  ✅ Found {daily_items} items for {current_date.strftime('%Y-%m-%d')}")
-                current_date -= timedelta(days=1)
-
-            except Exception as date_error:
-                print(f"    ⚠️ Error processing date: {str(date_error)}")
-                current_date -= timedelta(days=1)
-                continue
+    # Iterate through each day backwards, skipping days crawled before
+    finished = state.finished_days()
+    days = []
+    current_date = end_date
+    while current_date >= start_date:
+        if current_date.strftime("%Y-%m-%d") in finished:
+            print(f"  ⏭️ {current_date.strftime('%Y-%m-%d')} was already crawled")
+        else:
+            days.append(current_date)
+        current_date -= timedelta(days=1)
+
+    write_lock = threading.Lock()
+    sink = create_sink(output_format, path_stem, batch_size)
+    # Pages in the sink's buffer, recorded in the crawl state once written
+    pending_pages = []
+    pending_ids = set()
+
+    def flush():
+        # Caller holds write_lock
+        sink.flush()
+        for day_key, page, ids in pending_pages:
+            state.finish_page(day_key, page, ids)
+        pending_pages.clear()
+        pending_ids.clear()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pages") as executor:
+
+            def save_page(day: datetime, page: int, items: list):
+                day_key = day.strftime("%Y-%m-%d")
+                with write_lock:
+                    # Skip items this or an earlier run already saved for the day
+                    ids = [str(getattr(item, "id", "")) for item in items]
+                    new_ids = {
+                        item_id for item_id in state.unseen(day_key, ids)
+                        if (day_key, item_id) not in pending_ids
+                    }
+                    saved = []
+                    rows = []
+                    for item, item_id in zip(items, ids):
+                        if item_id not in new_ids:
+                            continue
+                        try:
+                            rows.append(item_row(item, day))
+                            saved.append(item)
+                            new_ids.discard(item_id)
+                            pending_ids.add((day_key, item_id))
+                        except Exception as item_error:
+                            print(f"    ⚠️ Error processing item: {str(item_error)}")
+                    pending_pages.append((day_key, page, [str(getattr(item, "id", "")) for item in saved]))
+                    if sink.add(rows):
+                        flush()
+
+                # Download images
+                for item in saved:
+                    if hasattr(item, "photo") and item.photo:
+                        images.submit(item.photo, item.id)
+
+            futures = {
+                executor.submit(
+                    fetch_day, source, day, state.next_page(day.strftime("%Y-%m-%d")), limiter, save_page
+                ): day
+                for day in days
+            }
+            for future in as_completed(futures):
+                day = futures[future]
+                try:
+                    pages = future.result()
+                except Exception as date_error:
+                    print(f"    ⚠️ Error processing {day.strftime('%Y-%m-%d')}: {str(date_error)}")
+                    continue
+
+                if pages is None:
+                    print(f"  ⏸️ Stopped {day.strftime('%Y-%m-%d')} early, the next run resumes it")
+                    continue
+                # The day's rows must be on disk before it counts as finished
+                with write_lock:
+                    flush()
+                state.finish_day(day.strftime("%Y-%m-%d"), pages)
+                print(f"  ✅ Finished {day.strftime('%Y-%m-%d')} after {pages} pages")
+    finally:
+        with write_lock:
+            flush()
+            sink.close()
+        images.close()
+        state.close()
 
     print(f"\n✨ Completed scraping for {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-    print(f"📊 Total items collected: {total_items}")
-    print(f"💾 Data saved to: {filename}\n")
+    print(f"📊 Total items collected: {sink.rows_written}")
+    print(f"💾 Data saved to: {sink.path}\n")
 
 def main():
     parser = argparse.ArgumentParser(description='Scrape Vinted data for a specific date range')
     parser.add_argument('start_date', type=str, help='Start date (YYYY-MM-DD)')
     parser.add_argument('end_date', type=str, help='End date (YYYY-MM-DD)')
-    
+    parser.add_argument('--workers', type=int, default=1, help='Days fetched in parallel')
+    parser.add_argument('--rate', type=float, default=0.5, help='Page requests per second, across all workers')
+    parser.add_argument('--image-workers', type=int, default=4, help='Parallel image downloads')
+    parser.add_argument('--api-url', type=str, help='Fetch pages from this JSON API instead of Vinted, e.g. stub_server.py')
+    parser.add_argument('--data-dir', type=str, default='analytics/vintalytics/data', help='Where CSV files and images are written')
+    parser.add_argument('--state', type=str, help='Crawl state database (default: crawl_state.sqlite in the data dir)')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help='Output file format')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Rows buffered before they are written')
+
     args = parser.parse_args()
-    
+
     try:
         # Parse dates
         start_date = datetime.strptime(args.start_date, '%Y-%m-%d')
         end_date = datetime.strptime(args.end_date, '%Y-%m-%d')
-        
+
         # Validate dates
         current_date = datetime.now()
         if start_date > end_date:
@@ -183,16 +287,37 @@ def main():
         if start_date.year < 2010:
             print("❌ Error: Dates before 2010 are not supported")
             return
-            
+        if args.rate <= 0:
+            print("❌ Error: --rate must be greater than 0")
+            return
+        if args.workers < 1:
+            print("❌ Error: --workers must be at least 1")
+            return
+        if args.batch_size < 1:
+            print("❌ Error: --batch-size must be at least 1")
+            return
+
         # Calculate date range
         date_range = (end_date - start_date).days
         print(f"📅 Scraping {date_range + 1} days of data")
-        
-        fetch_and_save_items(start_date, end_date)
-        
+
+        source = HttpSource(args.api_url) if args.api_url else VintedSource()
+        fetch_and_save_items(
+            start_date,
+            end_date,
+            workers=args.workers,
+            rate=args.rate,
+            image_workers=args.image_workers,
+            source=source,
+            data_dir=args.data_dir,
+            state_path=args.state,
+            output_format=args.format,
+            batch_size=args.batch_size,
+        )
+
     except ValueError:
         print("❌ Error: Invalid date format. Please use YYYY-MM-DD")
         return
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
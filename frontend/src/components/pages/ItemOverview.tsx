@@ -11,9 +11,10 @@ import {
     CommandList,
 } from "@/components/ui/command"
 
-interface TimeSeriesData {
+interface SummaryData {
     date: string;
-    [key: string]: string | number;
+    count: number;
+    price: number | null;
 }
 
 interface ChartData {
@@ -32,7 +33,6 @@ interface KeywordAnalysis {
     max_price: number;
 }
 
-type DataType = 'listings' | 'pricing';
 type ValueKey = 'count' | 'price';
 
 const ItemOverview = ({ brand }: ItemOverviewProps) => {
@@ -44,47 +44,36 @@ const ItemOverview = ({ brand }: ItemOverviewProps) => {
     const [suggestedTags, setSuggestedTags] = useState<{ word: string; count: number }[]>([]);
     const [isCommandOpen, setIsCommandOpen] = useState(false);
 
-    const fetchTimeSeriesData = useCallback(async (
-        dataType: DataType,
-        valueKey: ValueKey,
-        setData: (data: ChartData[]) => void
-    ) => {
+    const fetchSummary = useCallback(async () => {
         try {
             const encodedBrand = encodeURIComponent(brand);
-            const endpoint = dataType === 'listings' ? 'count' : 'average';
+            // Listings, prices and tags come from a single summary request
             const response = await fetch(
-                `${config.apiUrl}/api/${encodedBrand}/monthly/${dataType}/${endpoint}`
+                `${config.apiUrl}/api/${encodedBrand}/monthly/summary?keyword_limit=50`
             );
             const data = await response.json();
 
-            const transformedData: ChartData[] = data.data.map((item: TimeSeriesData) => ({
-                month: new Date(item.date).toLocaleString('default', { month: 'long' }),
-                [dataType === 'listings' ? 'listings' : 'price']: item[valueKey] as number
-            }));
+            const toChartData = (valueKey: ValueKey, chartKey: string): ChartData[] => {
+                const transformedData: ChartData[] = data.data
+                    .filter((item: SummaryData) => item[valueKey] !== null)
+                    .map((item: SummaryData) => ({
+                        month: new Date(item.date).toLocaleString('default', { month: 'long' }),
+                        [chartKey]: item[valueKey] as number
+                    }));
 
-            const uniqueData = Array.from(new Map(transformedData.map(item => [item.month, item])).values());
+                return Array.from(new Map(transformedData.map(item => [item.month, item])).values());
+            };
 
-            setData(uniqueData);
+            setListingsChartData(sortDataByMonth(toChartData('count', 'listings')));
+            setPriceChartData(sortDataByMonth(toChartData('price', 'price')));
+            setSuggestedTags(data.keywords || []);
         } catch (error) {
-            console.error(`Error fetching ${dataType} data:`, error);
+            console.error('Error fetching brand summary:', error);
         } finally {
             setIsLoading(false);
         }
     }, [brand]);
 
-    const fetchTopTags = useCallback(async () => {
-        try {
-            const encodedBrand = encodeURIComponent(brand);
-            const response = await fetch(
-                `${config.apiUrl}/api/${encodedBrand}/keywords/top/50`
-            );
-            const data = await response.json();
-            setSuggestedTags(data.keywords || []);
-        } catch (error) {
-            console.error('Error fetching top tags:', error);
-        }
-    }, [brand]);
-
     const fetchTagAnalysis = useCallback(async () => {
         if (selectedTags.length === 0) {
             setTagAnalysis(null);
@@ -105,10 +94,8 @@ const ItemOverview = ({ brand }: ItemOverviewProps) => {
     }, [brand, selectedTags]);
 
     useEffect(() => {
-        fetchTimeSeriesData('listings', 'count', (data) => setListingsChartData(sortDataByMonth(data)));
-        fetchTimeSeriesData('pricing', 'price', (data) => setPriceChartData(sortDataByMonth(data)));
-        fetchTopTags();
-    }, [brand, fetchTimeSeriesData, fetchTopTags]);
+        fetchSummary();
+    }, [brand, fetchSummary]);
 
 
     useEffect(() => {